@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares decoding and encoding large messages in the login server's own
+process with offloading them to a CodecPool. For each it reports the CPU
+time that the login server's process spends per message, which is what
+offloading is meant to reduce, and the number of messages handled per
+second by a number of greenlets that each handle one message at a time,
+like the readers and writers of connections do.
+
+Run from the repository root with: python -m benchmarks.codecoffload
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import time
+
+import gevent
+
+from common.codecpool import CodecPool
+from common.datatypes import encode_enumfields, m0071, m052d
+from common.loginprotocol import decode_fields
+from .logintraffic import login_requests, server_list
+
+
+def measure(func, argument, nmessages, concurrency):
+    def handle_messages():
+        for _ in range(nmessages // concurrency):
+            func(argument)
+
+    start_cpu_time = time.process_time()
+    start_time = time.perf_counter()
+    gevent.joinall([gevent.spawn(handle_messages) for _ in range(concurrency)])
+    duration = time.perf_counter() - start_time
+    cpu_time = time.process_time() - start_cpu_time
+    return cpu_time / nmessages, nmessages / duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=4000, help='number of messages to decode and encode')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of greenlets handling messages')
+    parser.add_argument('--processes', type=int, default=4, help='number of codec processes')
+    parser.add_argument('--servers', type=int, default=100, help='number of servers in the large messages')
+    args = parser.parse_args()
+
+    codec_pool = CodecPool(args.processes, min_size=0)
+
+    reply = [server_list(args.servers)]
+    request = login_requests()[0]
+    request.set(request.content + [server_list(args.servers)])
+    request_bytes = bytes(encode_enumfields([request]))
+
+    def decode_lazily(data):
+        # Like the login server does for small requests, accessing only the login fields
+        fields = decode_fields(data, lazy=True)
+        return fields[0].findbytype(m052d), fields[0].findbytype(m0071)
+
+    decode_description = 'decode %d byte request' % len(request_bytes)
+    encode_description = 'encode %d byte reply' % len(encode_enumfields(reply))
+    for description, name, func, argument in (
+            (decode_description, 'inline', decode_fields, request_bytes),
+            (decode_description, 'lazy', decode_lazily, request_bytes),
+            (decode_description, 'offloaded', codec_pool.decode, request_bytes),
+            (encode_description, 'inline', encode_enumfields, reply),
+            (encode_description, 'offloaded', codec_pool.encode, reply)):
+        cpu_time, throughput = measure(func, argument, args.messages, args.concurrency)
+        print('%-26s %-10s %7.1f us CPU per message in this process, %7.0f messages/s' %
+              (description, name + ':', cpu_time * 1e6, throughput))
+
+    codec_pool.close()
+
+
+if __name__ == '__main__':
+    main()
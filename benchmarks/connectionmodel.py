@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares the connection model with a reader and writer greenlet per
+connection to the one that sends directly. For a number of concurrent
+connections it reports the memory allocated per connection, the number of
+greenlets and the round-trip time of a request that the server replies to.
+
+Run from the repository root with: python -m benchmarks.connectionmodel
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import gc
+import struct
+import time
+import tracemalloc
+
+import gevent
+import gevent.queue
+from gevent import socket
+from greenlet import greenlet
+
+from common.connectionhandler import (IncomingConnectionHandler, BufferedTcpMessageConnectionReader,
+                                      TcpMessageConnectionWriter, Peer, PeerConnectedMessage,
+                                      PeerDisconnectedMessage)
+from common.tcpmessage import BufferedTcpMessageReader
+
+
+class BenchmarkMessage:
+    def __init__(self, data):
+        self.data = data
+
+
+class BenchmarkReader(BufferedTcpMessageConnectionReader):
+    def decode(self, msg_bytes):
+        return BenchmarkMessage(msg_bytes)
+
+
+class BenchmarkWriter(TcpMessageConnectionWriter):
+    def encode(self, msg):
+        return msg
+
+
+class BenchmarkPeer(Peer):
+    pass
+
+
+class BenchmarkHandler(IncomingConnectionHandler):
+    def create_connection_instances(self, sock, address):
+        return BenchmarkReader(sock, max_message_size = 1450), BenchmarkWriter(sock, max_message_size = 1450), \
+               BenchmarkPeer()
+
+
+def serve(incoming_queue, peers):
+    while True:
+        msg = incoming_queue.get()
+        if isinstance(msg, BenchmarkMessage):
+            msg.peer.send(msg.data)
+        elif isinstance(msg, PeerConnectedMessage):
+            peers.add(msg.peer)
+        elif isinstance(msg, PeerDisconnectedMessage):
+            peers.discard(msg.peer)
+            msg.peer.disconnect()
+
+
+def count_greenlets():
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, greenlet) and not obj.dead)
+
+
+def measure(direct_send, port, nconnections, nrequests):
+    incoming_queue = gevent.queue.Queue()
+    handler = BenchmarkHandler('benchmark', '127.0.0.1', port, incoming_queue, direct_send)
+    peers = set()
+    tasks = [gevent.spawn(handler.run), gevent.spawn(serve, incoming_queue, peers)]
+    gevent.sleep(0.1)
+
+    greenlets_before = count_greenlets()
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    clients = [socket.create_connection(('127.0.0.1', port)) for _ in range(nconnections)]
+    while len(peers) < nconnections:
+        gevent.sleep(0.01)
+    memory_per_connection = (tracemalloc.get_traced_memory()[0] - memory_before) / nconnections
+    tracemalloc.stop()
+    greenlets = count_greenlets() - greenlets_before
+
+    request = struct.pack('<H', 16) + bytes(16)
+    round_trip_times = []
+    for i in range(nrequests):
+        client = clients[i % nconnections]
+        reader = BufferedTcpMessageReader(client, max_message_size = 1450)
+        start_time = time.perf_counter()
+        client.sendall(request)
+        reader.receive()
+        round_trip_times.append(time.perf_counter() - start_time)
+
+    for client in clients:
+        client.close()
+    gevent.sleep(0.5)
+    gevent.killall(tasks)
+
+    round_trip_times.sort()
+    return (memory_per_connection, greenlets,
+            round_trip_times[len(round_trip_times) // 2], round_trip_times[len(round_trip_times) * 99 // 100])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connections', type=int, default=2000, help='number of concurrent connections')
+    parser.add_argument('--requests', type=int, default=5000, help='number of requests to time')
+    parser.add_argument('--port', type=int, default=19000, help='first port to listen on')
+    args = parser.parse_args()
+
+    for port, direct_send in ((args.port, False), (args.port + 1, True)):
+        memory, greenlets, median, p99 = measure(direct_send, port, args.connections, args.requests)
+        print('%-14s %7.0f bytes/connection, %6d greenlets, round trip median %6.1f us, p99 %6.1f us' %
+              ('direct send:' if direct_send else 'queue+writer:', memory, greenlets, median * 1e6, p99 * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Measures the cost of looking up the class of every enumfield in captured
+login traffic, comparing the former string based lookup in globals() with
+the ident-indexed registry, and the overall decoding speed of that traffic.
+It also compares decoding a login request completely with decoding it lazily
+when only the fields that the login handler uses are accessed.
+
+Run from the repository root with: python -m benchmarks.decode
+"""
+
+import argparse
+import timeit
+
+from common import datatypes
+from common.loginprotocol import PacketReader, decode_fields
+from .logintraffic import encode, login_replies, login_requests, server_list
+
+
+def _collect_idents(data):
+    idents = []
+    stream = PacketReader()
+    stream.feed(data)
+
+    def collect(field):
+        idents.append(field.ident)
+        if isinstance(field, datatypes.enumblockarray):
+            for element in field.content:
+                collect(element)
+        elif isinstance(field, datatypes.arrayofenumblockarrays):
+            for arr in field.arrays:
+                for element in arr:
+                    collect(element)
+
+    while stream.available():
+        collect(datatypes.construct_top_level_enumfield(stream))
+    return idents
+
+
+def _lookup_by_name(idents):
+    namespace = vars(datatypes)
+    for ident in idents:
+        namespace[('m%04X' % ident).lower()]
+
+
+def _lookup_by_ident(idents):
+    registry = datatypes.nested_classes
+    for ident in idents:
+        registry[ident]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000, help='number of iterations')
+    args = parser.parse_args()
+
+    data = encode(login_requests() + login_replies())
+    nested_idents = [ident for ident in _collect_idents(data) if ident in datatypes.nested_classes]
+
+    by_name = timeit.timeit(lambda: _lookup_by_name(nested_idents), number=args.number)
+    by_ident = timeit.timeit(lambda: _lookup_by_ident(nested_idents), number=args.number)
+    per_lookup = args.number * len(nested_idents)
+    print('class lookup by name:  %6.1f ns per field' % (by_name / per_lookup * 1e9))
+    print('class lookup by ident: %6.1f ns per field (%.1fx)' % (by_ident / per_lookup * 1e9, by_name / by_ident))
+
+    decode_time = timeit.timeit(lambda: decode_fields(data), number=args.number)
+    print('decoding %d bytes of login traffic: %.1f us' % (len(data), decode_time / args.number * 1e6))
+
+    def handle_login(lazy):
+        request = decode_fields(login_request_data, lazy)[0]
+        return request.findbytype(datatypes.m052d), request.findbytype(datatypes.m0071)
+
+    login_request = login_requests()[0]
+    login_request.set(login_request.content + [server_list(10)])
+    login_request_data = encode([login_request])
+    eager_time = timeit.timeit(lambda: handle_login(False), number=args.number)
+    lazy_time = timeit.timeit(lambda: handle_login(True), number=args.number)
+    print('decoding and handling a %d byte padded login request: %.1f us eager, %.1f us lazy (%.1fx)' %
+          (len(login_request_data),
+           eager_time / args.number * 1e6,
+           lazy_time / args.number * 1e6,
+           eager_time / lazy_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares encoding replies by writing every enumfield to an io.BytesIO, as
+the login server used to do, with encode_enumfields, which packs them into
+a preallocated buffer. It also compares building and encoding the login
+reply for every login with rendering it from a MessageTemplate.
+
+Run from the repository root with: python -m benchmarks.encode
+"""
+
+import argparse
+import timeit
+
+from common.datatypes import encode_enumfields
+from login_server.player.state.unauthenticated_state import login_reply_template
+from .logintraffic import encode, login_replies, login_reply, server_list
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=5000, help='number of iterations')
+    args = parser.parse_args()
+
+    for description, fields in (('a003e login reply', [login_reply()]),
+                                ('100 server list', [server_list(100)])):
+        assert encode(fields) == encode_enumfields(fields)
+        stream_time = min(timeit.repeat(lambda: encode(fields), number=args.number, repeat=5))
+        packed_time = min(timeit.repeat(lambda: encode_enumfields(fields), number=args.number, repeat=5))
+        print('%-18s: %8.1f us with io.BytesIO, %8.1f us preallocated (%.2fx)' %
+              (description,
+               stream_time / args.number * 1e6,
+               packed_time / args.number * 1e6,
+               stream_time / packed_time))
+
+    def build_and_encode():
+        return encode_enumfields(login_replies('somename')[:2])
+
+    def render():
+        return login_reply_template.render(display_name='somename')
+
+    assert build_and_encode() == render()
+    build_time = timeit.timeit(build_and_encode, number=args.number)
+    render_time = timeit.timeit(render, number=args.number)
+    print('%-18s: %8.1f us built per login, %8.1f us from template (%.1fx)' %
+          ('login reply',
+           build_time / args.number * 1e6,
+           render_time / args.number * 1e6,
+           build_time / render_time))
+
+
+if __name__ == '__main__':
+    main()
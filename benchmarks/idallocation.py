@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares the cost of picking a unique ID for a connecting player, with an
+increasing number of players already online, between scanning the IDs in use
+and the ID allocator.
+
+Run from the repository root with: python -m benchmarks.idallocation
+"""
+
+import argparse
+import timeit
+
+from common import utils
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20, help='number of connect/disconnect cycles')
+    args = parser.parse_args()
+
+    for online in (100, 1000, 10000, 100000):
+        players = {}
+        allocator = utils.IdAllocator(utils.MIN_UNVERIFIED_ID, utils.MAX_UNVERIFIED_ID)
+        for _ in range(online):
+            players[allocator.allocate()] = None
+
+        def scan_connect():
+            unique_id = utils.first_unused_number_above(players.keys(),
+                                                        utils.MIN_UNVERIFIED_ID,
+                                                        utils.MAX_UNVERIFIED_ID)
+            players[unique_id] = None
+            del players[unique_id]
+
+        def allocator_connect():
+            unique_id = allocator.allocate()
+            players[unique_id] = None
+            del players[unique_id]
+            allocator.release(unique_id)
+
+        scan_time = timeit.timeit(scan_connect, number=args.number)
+        allocator_time = timeit.timeit(allocator_connect, number=args.number * 1000)
+        print('%6d players online: %10.2f us scanning, %6.2f us allocator' %
+              (online, scan_time / args.number * 1e6, allocator_time / (args.number * 1000) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Login traffic for use in benchmarks, built from the requests a game client
+sends while logging in and the replies the login server sends back.
+"""
+
+import io
+
+from common.datatypes import *
+
+
+def encode(fields):
+    stream = io.BytesIO()
+    for field in fields:
+        field.write(stream)
+    return stream.getvalue()
+
+
+def login_requests(login_name = 'someplayer'):
+    return [
+        a003b().set([
+            m052d().set(login_name),
+            m0071().set(b'p' * 90),
+        ]),
+        a0034(),
+        a0039(),
+        a01e8(),
+        a0188(),
+    ]
+
+
+def login_reply(display_name = 'unvrf-someplayer'):
+    return a003e().set([
+        m03c3().set(0x0017e6d5),
+        m0375().set(0xf3f8),
+        m01ff(),
+        m0213().set(hexparse('01 00 6e')),
+        m03c5().set(display_name),
+        m04d4().set(1),
+        m036e().set(0x4949),
+        m0064(),
+        m0473(),
+        m00db().set(0x8bcc),
+        m0270().set(0xf),
+        m001c().set(0x384),
+        m04ff().set("pageup"),
+        m010c().set([
+            [
+                m04da().set(1),
+                m0371().set(0xa26f),
+            ],
+            [
+                m04da().set(2),
+                m0371().set(0xa20b),
+            ],
+            [
+                m04da().set(4),
+                m0371().set(0xcfac),
+            ]
+        ])
+    ])
+
+
+def login_replies(display_name = 'unvrf-someplayer'):
+    return [
+        login_reply(display_name),
+        m0170().set([
+            [
+                m0322().set(0x46b),
+                m0262().set(0xab95),
+            ],
+        ]),
+        a0034().set([
+            m03c5().set(display_name),
+            m010c().set([
+                [
+                    m00b5().set(0x2ac950),
+                    m03df().set(0x237),
+                    m0287().set(0x645),
+                    m0282().set(0x85d),
+                    m0276().set(0x355),
+                    m0326().set("Dome City"),
+                    m0563().set(0x1f4),
+                    m0480().set(0xb),
+                ],
+            ]),
+            m0180(),
+            m0136()
+        ]),
+        a0039().set([
+            m0241(),
+            m02a9().set(0x00000497),
+            m00b5().set(0x002ac950),
+            m03c5().set(display_name),
+            m0327(),
+            m03df().set(0x00000237),
+            m00c2().set("22976"),
+            m0303(),
+            m0485(),
+            m001f(),
+            m0029(),
+            m0388(),
+            m00bf().set(hexparse('02 00 23 29 7f 00 00 01')),
+        ]),
+        a01e8().set([
+            m04da().set(0x2),
+            m05d1().set(0x1),
+        ]),
+        a0188().set([
+            m0376(),
+        ]),
+    ]
+
+
+def server_list(nservers):
+    """ A large reply in the shape of a server list, using the enumfields that are known here """
+    return m010c().set([
+        [
+            m04da().set(server_id),
+            m0371().set(0xa26f),
+            m0326().set('Server %d' % server_id),
+            m02b2(),
+            m0347().set(0x18),
+            m04d4().set(1),
+        ] for server_id in range(nservers)
+    ])
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares the time findbytype takes on decoded enumblockarrays of increasing
+length, containing a large server list, between the former linear scan and
+the ident index.
+
+Run from the repository root with: python -m benchmarks.lookup
+"""
+
+import argparse
+import timeit
+
+from common import datatypes
+from common.loginprotocol import decode_fields
+from .logintraffic import encode, server_list
+
+
+def _linear_findbytype(arr, requestedtype):
+    for item in arr.content:
+        if type(item) == requestedtype:
+            return item
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000, help='number of lookups')
+    args = parser.parse_args()
+
+    for length in (10, 100, 1000):
+        fields = [datatypes.m0376().set(i) for i in range(length - 2)]
+        fields += [server_list(100), datatypes.m03c5().set('somename')]
+        arr = decode_fields(encode([datatypes.a0034().set(fields)]))[0]
+
+        linear_time = timeit.timeit(lambda: _linear_findbytype(arr, datatypes.m03c5), number=args.number)
+        index_time = timeit.timeit(lambda: arr.findbytype(datatypes.m03c5), number=args.number)
+        print('%4d elements: %8.2f us linear, %6.2f us indexed' %
+              (length, linear_time / args.number * 1e6, index_time / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Reports how much memory decoded enumfields take, by decoding a large server
+list and login traffic and counting the allocated bytes per decoded field.
+
+Run from the repository root with: python -m benchmarks.memory
+"""
+
+import argparse
+import tracemalloc
+
+from common import datatypes
+from common.loginprotocol import decode_fields
+from .logintraffic import encode, login_replies, server_list
+
+
+def _count_fields(fields):
+    count = 0
+    for field in fields:
+        count += 1
+        if isinstance(field, datatypes.enumblockarray):
+            count += _count_fields(field.content)
+        elif isinstance(field, datatypes.arrayofenumblockarrays):
+            for arr in field.arrays:
+                count += _count_fields(arr)
+    return count
+
+
+def measure(data, copies):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    decoded = [decode_fields(data) for _ in range(copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    nfields = sum(_count_fields(fields) for fields in decoded)
+    return (after - before) / nfields
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--copies', type=int, default=100, help='number of times to decode each message')
+    args = parser.parse_args()
+
+    for description, fields in (('login replies', login_replies()),
+                                ('100 server list', [server_list(100)])):
+        print('%-16s: %6.1f bytes per decoded field' % (description, measure(encode(fields), args.copies)))
+
+
+if __name__ == '__main__':
+    main()
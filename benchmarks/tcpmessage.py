@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares the number of messages per second that TcpMessageReader and
+BufferedTcpMessageReader can receive over a socketpair.
+
+Run from the repository root with: python -m benchmarks.tcpmessage
+"""
+
+import argparse
+import socket
+import struct
+import multiprocessing
+import time
+
+from common.tcpmessage import BufferedTcpMessageReader, TcpMessageReader
+
+
+def _send_messages(sock, message_size, count):
+    message = struct.pack('<H', message_size) + bytes(message_size)
+    sock.sendall(message * count)
+
+
+def measure(reader_class, message_size, count):
+    sender_sock, receiver_sock = socket.socketpair()
+    try:
+        reader = reader_class(receiver_sock, max_message_size = 1450)
+        sender = multiprocessing.Process(target = _send_messages, args = (sender_sock, message_size, count))
+
+        start_time = time.perf_counter()
+        sender.start()
+        for _ in range(count):
+            reader.receive()
+        duration = time.perf_counter() - start_time
+        sender.join()
+    finally:
+        sender_sock.close()
+        receiver_sock.close()
+
+    return count / duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200000, help='number of messages to send')
+    args = parser.parse_args()
+
+    for message_size in (16, 200, 1450):
+        unbuffered = measure(TcpMessageReader, message_size, args.count)
+        buffered = measure(BufferedTcpMessageReader, message_size, args.count)
+        print('%4d byte messages: %9.0f msg/s unbuffered, %9.0f msg/s buffered (%.1fx)' %
+              (message_size, unbuffered, buffered, buffered / unbuffered))
+
+
+if __name__ == '__main__':
+    main()
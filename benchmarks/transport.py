@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares the gevent and asyncio transports side by side. A number of
+clients each keep a fixed number of requests in flight to a server that
+echoes them, and for each transport this reports the requests handled per
+second and the median and p99 round-trip time.
+
+Run from the repository root with: python -m benchmarks.transport
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import collections
+import struct
+import time
+
+import gevent
+import gevent.queue
+from gevent import socket
+
+from common.asynciotransport import AsyncioTransport
+from common.connectionhandler import GeventTransport, PeerConnectedMessage, PeerDisconnectedMessage
+from common.tcpmessage import BufferedTcpMessageReader
+from .connectionmodel import BenchmarkHandler, BenchmarkMessage
+
+
+def serve(incoming_queue, peers):
+    while True:
+        msg = incoming_queue.get()
+        if isinstance(msg, BenchmarkMessage):
+            msg.peer.send(msg.data)
+        elif isinstance(msg, PeerConnectedMessage):
+            peers.add(msg.peer)
+        elif isinstance(msg, PeerDisconnectedMessage):
+            peers.discard(msg.peer)
+            msg.peer.disconnect()
+
+
+def run_client(port, nrequests, pipeline_depth, round_trip_times):
+    client = socket.create_connection(('127.0.0.1', port))
+    reader = BufferedTcpMessageReader(client, max_message_size = 1450)
+    request = struct.pack('<H', 64) + bytes(64)
+    send_times = collections.deque()
+    sent = 0
+    for _ in range(nrequests):
+        while sent < nrequests and len(send_times) < pipeline_depth:
+            send_times.append(time.perf_counter())
+            client.sendall(request)
+            sent += 1
+        reader.receive()
+        round_trip_times.append(time.perf_counter() - send_times.popleft())
+    client.close()
+
+
+def measure(transport, direct_send, port, nclients, nrequests, pipeline_depth):
+    incoming_queue = gevent.queue.Queue()
+    handler = BenchmarkHandler('benchmark', '127.0.0.1', port, incoming_queue, direct_send, transport=transport)
+    peers = set()
+    tasks = [gevent.spawn(handler.run), gevent.spawn(serve, incoming_queue, peers)]
+    gevent.sleep(0.1)
+
+    round_trip_times = []
+    start_time = time.perf_counter()
+    gevent.joinall([gevent.spawn(run_client, port, nrequests, pipeline_depth, round_trip_times)
+                    for _ in range(nclients)])
+    duration = time.perf_counter() - start_time
+
+    gevent.sleep(0.5)
+    gevent.killall(tasks)
+
+    round_trip_times.sort()
+    return (len(round_trip_times) / duration,
+            round_trip_times[len(round_trip_times) // 2], round_trip_times[len(round_trip_times) * 99 // 100])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=200, help='number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='number of requests per client')
+    parser.add_argument('--pipeline', type=int, default=4, help='number of requests each client keeps in flight')
+    parser.add_argument('--port', type=int, default=19100, help='first port to listen on')
+    args = parser.parse_args()
+
+    port = args.port
+    for direct_send in (False, True):
+        for name, transport in (('gevent', GeventTransport()), ('asyncio', AsyncioTransport())):
+            throughput, median, p99 = measure(transport, direct_send, port,
+                                              args.clients, args.requests, args.pipeline)
+            print('%-8s %-13s %8.0f requests/s, round trip median %7.1f us, p99 %7.1f us' %
+                  (name, 'direct send:' if direct_send else 'queue+writer:', throughput, median * 1e6, p99 * 1e6))
+            port += 1
+
+
+if __name__ == '__main__':
+    main()
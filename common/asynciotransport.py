@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+
+import gevent.event
+import gevent.selectors
+
+from common.geventwrapper import gevent_spawn
+
+# Bytes an AsyncioSocket buffers on behalf of a reader that is not waiting,
+# before it stops reading from the connection
+_read_high_water = 0x40000
+_read_low_water = 0x10000
+
+_loop = None
+
+
+def get_event_loop():
+    """
+    Returns the asyncio event loop that the transport runs on.
+
+    The loop runs in a greenlet of its own and waits for its sockets with a
+    gevent selector, so that it shares the thread with the greenlets that
+    use the connections instead of needing a thread of its own.
+    """
+    global _loop
+    if _loop is None:
+        _loop = asyncio.SelectorEventLoop(gevent.selectors.GeventSelector())
+        gevent_spawn('asyncio event loop', _loop.run_forever)
+    return _loop
+
+
+def _wake_up_loop():
+    # Sockets that a transport starts watching while the loop is waiting are
+    # only picked up once it wakes up
+    get_event_loop().call_soon_threadsafe(lambda: None)
+
+
+def run_in_loop(coroutine):
+    """ Runs coroutine on the transport's event loop and waits for its result in the calling greenlet """
+    loop = get_event_loop()
+    result = gevent.event.AsyncResult()
+
+    def set_result(task):
+        if task.cancelled():
+            result.set_exception(asyncio.CancelledError())
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set(task.result())
+
+    loop.call_soon_threadsafe(lambda: loop.create_task(coroutine).add_done_callback(set_result))
+    return result.get()
+
+
+class AsyncioSocket(asyncio.BufferedProtocol):
+    """
+    Protocol that makes an asyncio connection look like a blocking socket to
+    the greenlets that use it, so that the TcpMessage readers and writers
+    and everything built on them work with it unchanged.
+
+    When a greenlet is waiting in recv_into, get_buffer hands its buffer to
+    the transport, so that received data does not need to be copied. Data
+    that arrives while nobody is waiting is buffered until the next recv.
+    Output is passed to transport.writelines, which only waits when the
+    transport has asked to pause writing.
+    """
+    def __init__(self, on_connected=None):
+        self.on_connected = on_connected
+        self.transport = None
+        self.peername = None
+        self.target = None
+        self.target_filled = 0
+        self.filling_target = False
+        self.scratch = bytearray(0x10000)
+        self.received = bytearray()
+        self.reading_paused = False
+        self.eof = False
+        self.closed = False
+        self.readable = gevent.event.Event()
+        self.writable = gevent.event.Event()
+        self.writable.set()
+
+    # Called from the event loop
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peername = transport.get_extra_info('peername')
+        if self.on_connected:
+            self.on_connected(self)
+
+    def get_buffer(self, sizehint):
+        self.filling_target = self.target is not None and self.target_filled == 0
+        return self.target if self.filling_target else self.scratch
+
+    def buffer_updated(self, nbytes):
+        if self.filling_target:
+            self.target_filled = nbytes
+        else:
+            self.received += memoryview(self.scratch)[:nbytes]
+            if len(self.received) > _read_high_water and not self.reading_paused:
+                self.reading_paused = True
+                self.transport.pause_reading()
+        self.readable.set()
+
+    def eof_received(self):
+        self.eof = True
+        self.readable.set()
+        return False
+
+    def connection_lost(self, exc):
+        self.eof = True
+        self.closed = True
+        self.readable.set()
+        self.writable.set()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    # Called from greenlets
+
+    def recv_into(self, buffer, nbytes=0):
+        view = memoryview(buffer).cast('B')
+        if nbytes:
+            view = view[:nbytes]
+
+        if not self.received and not self.eof:
+            self.target = view
+            self.target_filled = 0
+            self.readable.clear()
+            try:
+                self.readable.wait()
+            finally:
+                self.target = None
+            if self.target_filled:
+                return self.target_filled
+
+        size = min(len(view), len(self.received))
+        view[:size] = memoryview(self.received)[:size]
+        del self.received[:size]
+        if self.reading_paused and len(self.received) < _read_low_water and not self.closed:
+            self.reading_paused = False
+            self.transport.resume_reading()
+            _wake_up_loop()
+        return size
+
+    def recv(self, bufsize):
+        buffer = bytearray(bufsize)
+        size = self.recv_into(buffer)
+        return bytes(buffer[:size])
+
+    def sendmsg(self, buffers, ancdata=(), flags=0):
+        if self.closed or self.transport.is_closing():
+            raise ConnectionResetError()
+        if not self.writable.is_set():
+            if flags:
+                raise BlockingIOError()
+            self.writable.wait()
+            if self.closed:
+                raise ConnectionResetError()
+
+        buffers = list(buffers)
+        self.transport.writelines(buffers)
+        if self.transport.get_write_buffer_size():
+            _wake_up_loop()
+        return sum(len(buffer) for buffer in buffers)
+
+    def sendall(self, data):
+        self.sendmsg([data])
+
+    def getpeername(self):
+        return self.peername
+
+    def close(self):
+        # Like closing one of gevent's sockets, make greenlets that are
+        # waiting on this one give up
+        self.eof = True
+        self.closed = True
+        self.readable.set()
+        self.writable.set()
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.close()
+            _wake_up_loop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncioTransport:
+    """
+    Serves and makes connections with asyncio instead of gevent's sockets.
+    With reuse_port, several processes can serve the same port.
+    """
+    def __init__(self, reuse_port=False):
+        self.reuse_port = reuse_port
+
+    def serve(self, address, port, handle):
+        def on_connected(sock):
+            gevent_spawn('asyncio connection', handle, sock, sock.peername)
+
+        loop = get_event_loop()
+        server = run_in_loop(loop.create_server(lambda: AsyncioSocket(on_connected), address, port,
+                                                reuse_port=self.reuse_port or None))
+        try:
+            gevent.event.Event().wait()
+        finally:
+            server.close()
+            _wake_up_loop()
+
+    def connect(self, address, port):
+        loop = get_event_loop()
+        transport, sock = run_in_loop(loop.create_connection(AsyncioSocket, str(address), port))
+        return sock
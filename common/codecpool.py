@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Pool of processes that decode login protocol messages, so that decoding
+large requests does not take up time in the process that handles them.
+
+The pool can encode as well, but sending a tree of enumfields to another
+process costs more than encoding it with encode_enumfields, so the login
+server does not do that (see benchmarks/codecoffload.py).
+
+A process that exits is replaced by a new one, and the requests it had not
+answered yet are handled in the calling process instead.
+"""
+
+import collections
+import logging
+import pickle
+import struct
+import sys
+
+import gevent.event
+import gevent.lock
+import gevent.subprocess
+
+from common.datatypes import encode_enumfields
+from common.errors import CodecProcessExitedError
+from common.geventwrapper import gevent_spawn
+from common.loginprotocol import decode_fields
+
+_size_struct = struct.Struct('<I')
+
+DECODE = 'decode'
+ENCODE = 'encode'
+
+
+class _CodecProcess:
+    """
+    A process of the pool with the results it still owes. The process
+    handles its requests in order, so results are matched to requests in
+    the order in which they were sent.
+    """
+    def __init__(self, index):
+        self.process = gevent.subprocess.Popen([sys.executable, '-m', 'common.codecpool'],
+                                               stdin=gevent.subprocess.PIPE,
+                                               stdout=gevent.subprocess.PIPE)
+        self.pending = collections.deque()
+        self.exited = False
+        self.write_lock = gevent.lock.Semaphore()
+        self.reader = gevent_spawn('codec process %d reader' % index, self._read_results)
+
+    def call(self, operation, argument):
+        payload = pickle.dumps((operation, argument), pickle.HIGHEST_PROTOCOL)
+        result = gevent.event.AsyncResult()
+        with self.write_lock:
+            if self.exited:
+                raise CodecProcessExitedError('Codec process exited')
+            self.pending.append(result)
+            try:
+                self.process.stdin.write(_size_struct.pack(len(payload)) + payload)
+                self.process.stdin.flush()
+            except OSError as e:
+                # The reader fails the pending results once it sees the process exit
+                self.exited = True
+                raise CodecProcessExitedError('Codec process exited') from e
+        return result.get()
+
+    def _read_results(self):
+        stdout = self.process.stdout
+        try:
+            while True:
+                header = stdout.read(_size_struct.size)
+                if len(header) < _size_struct.size:
+                    break
+                succeeded, value = pickle.loads(stdout.read(_size_struct.unpack(header)[0]))
+                result = self.pending.popleft()
+                if succeeded:
+                    result.set(value)
+                else:
+                    result.set_exception(value)
+        finally:
+            self.exited = True
+            while self.pending:
+                self.pending.popleft().set_exception(CodecProcessExitedError('Codec process exited'))
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            # Closing flushes what could not be written to a process that exited
+            pass
+        self.process.wait()
+
+
+class CodecPool:
+    """
+    Decodes and encodes messages in other processes. The calling greenlet
+    waits for the result, while other greenlets keep running.
+
+    The reader of a connection decodes one message at a time, so messages
+    from a peer stay in order. Only messages of at least min_size bytes are
+    worth the cost of sending them to another process; the codec's users
+    are expected to handle smaller ones themselves.
+    """
+    def __init__(self, nprocesses, min_size=1024):
+        self.logger = logging.getLogger(__name__)
+        self.min_size = min_size
+        self.processes = [_CodecProcess(index) for index in range(nprocesses)]
+
+    def _least_busy_process(self):
+        for index, process in enumerate(self.processes):
+            if process.exited:
+                process.close()
+                self.logger.warning('codec process %d exited with code %s, starting a new one' %
+                                    (index, process.process.returncode))
+                self.processes[index] = _CodecProcess(index)
+        return min(self.processes, key=lambda process: len(process.pending))
+
+    def _call(self, operation, argument):
+        try:
+            return self._least_busy_process().call(operation, argument)
+        except CodecProcessExitedError:
+            return _handle(operation, argument)
+
+    def decode(self, data):
+        """ Returns the top-level enumfields in data, completely decoded """
+        return self._call(DECODE, bytes(data))
+
+    def encode(self, fields):
+        """ Returns the encoded bytes of a list of enumfields """
+        return self._call(ENCODE, fields)
+
+    def close(self):
+        for process in self.processes:
+            process.close()
+
+
+def _handle(operation, argument):
+    if operation == DECODE:
+        return decode_fields(argument)
+    elif operation == ENCODE:
+        return bytes(encode_enumfields(argument))
+    else:
+        raise ValueError('Unknown codec operation %s' % operation)
+
+
+def serve(stdin, stdout):
+    """ Handles requests from the pool until it closes the connection """
+    while True:
+        header = stdin.read(_size_struct.size)
+        if len(header) < _size_struct.size:
+            break
+        operation, argument = pickle.loads(stdin.read(_size_struct.unpack(header)[0]))
+        try:
+            reply = (True, _handle(operation, argument))
+        except Exception as e:
+            reply = (False, e)
+        payload = pickle.dumps(reply, pickle.HIGHEST_PROTOCOL)
+        stdout.write(_size_struct.pack(len(payload)) + payload)
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    serve(sys.stdin.buffer, sys.stdout.buffer)
@@ -19,13 +19,19 @@
 #
 
 import gevent.server
-import gevent.queue
 from gevent import socket
 import logging
+import time
 
-from common.errors import PortInUseError
+from common import latencytracing
+from common.errors import OutgoingQueueOverflowError, PortInUseError
 from common.geventwrapper import gevent_spawn
-from common.tcpmessage import TcpMessageReader, TcpMessageWriter
+from common.metrics import Histogram
+from common.outgoingqueue import OutgoingLimits, OutgoingQueue
+from common.tcpmessage import BufferedTcpMessageReader, TcpMessageReader, TcpMessageWriter
+
+decode_seconds = Histogram('gaserver_decode_seconds', 'Time spent decoding received messages.', ['connection'])
+encode_seconds = Histogram('gaserver_encode_seconds', 'Time spent encoding messages to be sent.', ['connection'])
 
 
 class PeerConnectedMessage:
@@ -51,15 +57,18 @@ class ConnectionReader:
     def run(self):
         gevent.getcurrent().name = self.task_name
         self.incoming_queue.put(PeerConnectedMessage(self.peer))
+        metric_labels = (self.task_name,)
 
         try:
             while True:
                 msg_bytes = self.receive()
+                start_time = time.perf_counter()
                 msg = self.decode(msg_bytes)
+                decode_seconds.observe(time.perf_counter() - start_time, metric_labels)
                 msg.peer = self.peer
                 self.incoming_queue.put(msg)
 
-        except (ConnectionResetError, ConnectionAbortedError, gevent._socketcommon.cancel_wait_ex):
+        except (ConnectionResetError, ConnectionAbortedError, socket.cancel_wait_ex):
             self.logger.info('%s(%s): disconnected' % (self.task_name, self.task_id))
 
         finally:
@@ -84,44 +93,196 @@ class TcpMessageConnectionReader(ConnectionReader):
         return self.tcp_reader.receive()
 
 
+class BufferedTcpMessageConnectionReader(ConnectionReader):
+    def __init__(self, sock, max_message_size = 0xFFFF, dump_queue = None):
+        super().__init__(sock)
+        self.tcp_reader = BufferedTcpMessageReader(sock, max_message_size = max_message_size, dump_queue = dump_queue)
+
+    def receive(self):
+        return self.tcp_reader.receive()
+
+    def receive_all(self):
+        return self.tcp_reader.receive_all()
+
+
 class ConnectionWriter:
+    """
+    Sends messages to a peer.
+
+    Normally the writer runs in a greenlet of its own, taking messages from
+    the peer's outgoing queue. A connection can instead send directly, in
+    which case the peer calls write from whichever greenlet sends a message
+    and the writer only spawns a greenlet to flush the backlog when the
+    socket cannot take a message right away. Until that greenlet is done,
+    the peer puts messages in the outgoing queue and the greenlet sends them
+    as well.
+    """
     def __init__(self, sock):
         self.logger = logging.getLogger(__name__)
         self.task_name = None
         self.task_id = None
         self.outgoing_queue = None
         self.sock = sock
+        self.flusher = None
+        self.close_exception = None
+        self.closing = False
+        self.closed = False
 
     def run(self):
         gevent.getcurrent().name = self.task_name
         while True:
-            msg = self.outgoing_queue.get()
-            if not isinstance(msg, PeerDisconnectedMessage):
+            # Take everything that is queued at this point, so that it can be
+            # sent out with a single write
+            messages = [self.outgoing_queue.get()]
+            while not isinstance(messages[-1], PeerDisconnectedMessage) and not self.outgoing_queue.empty():
+                messages.append(self.outgoing_queue.get_nowait())
+
+            disconnect_msg = messages.pop() if isinstance(messages[-1], PeerDisconnectedMessage) else None
+
+            if messages:
                 try:
-                    msg_bytes = self.encode(msg)
-                    self.send(msg_bytes)
-                except (ConnectionResetError, ConnectionAbortedError):
-                    # Ignore a closed connection here. The reader will notice
-                    # it and send us the DisconnectedMessage to tell us that
-                    # we can close the socket and terminate
+                    self._send_messages(messages)
+                except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, socket.cancel_wait_ex):
+                    # Ignore a closed connection here. Either the other side
+                    # closed it, in which case the reader will notice it and
+                    # send us the DisconnectedMessage to tell us that we can
+                    # close the socket and terminate, or the peer aborted it
+                    # and the DisconnectedMessage is already queued
                     pass
-            else:
+
+            if disconnect_msg:
                 self.sock.close()
-                if msg.exception:
-                    raise msg.exception
+                if disconnect_msg.exception:
+                    raise disconnect_msg.exception
                 else:
                     break
 
         self.logger.info('%s(%s): writer exiting gracefully' % (self.task_name, self.task_id))
 
+    def _send_messages(self, messages):
+        """ Encode messages and send them with a single blocking write """
+        metric_labels = (self.task_name,)
+        dequeued_time = time.perf_counter()
+        encoded_messages = []
+        traced_messages = []
+        for msg in messages:
+            start_time = time.perf_counter()
+            if type(msg) is latencytracing.TracedMessage:
+                encoded_messages.append(self.encode(msg.message))
+                traced_messages.append((msg, time.perf_counter() - start_time))
+            else:
+                encoded_messages.append(self.encode(msg))
+            encode_seconds.observe(time.perf_counter() - start_time, metric_labels)
+
+        write_start_time = time.perf_counter()
+        self.send_many(encoded_messages)
+        written_time = time.perf_counter()
+        for traced_msg, encode_duration in traced_messages:
+            traced_msg.record_outgoing(dequeued_time, encode_duration,
+                                       written_time - write_start_time, written_time)
+
+    @property
+    def can_write(self):
+        """ Whether a writer that sends directly can take a message in write right now """
+        return self.flusher is None and not self.closing
+
+    def write(self, msg):
+        """ Encode and send msg from the calling greenlet without waiting for the socket """
+
+        start_time = time.perf_counter()
+        if type(msg) is latencytracing.TracedMessage:
+            traced_msg = msg
+            msg_bytes = self.encode(msg.message)
+        else:
+            traced_msg = None
+            msg_bytes = self.encode(msg)
+        encoded_time = time.perf_counter()
+        encode_seconds.observe(encoded_time - start_time, (self.task_name,))
+
+        try:
+            all_sent = self.send_many_nowait([msg_bytes])
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
+            # Ignore a closed connection here, the reader will notice it
+            all_sent = True
+        if not all_sent and self.flusher is None:
+            self.flusher = gevent_spawn("%s(%s)'s flusher" % (self.task_name, self.task_id), self._flush)
+
+        if traced_msg:
+            written_time = time.perf_counter()
+            traced_msg.record_outgoing(start_time, encoded_time - start_time, written_time - encoded_time, written_time)
+
+    def _flush(self):
+        try:
+            self.flush()
+            while not self.outgoing_queue.empty():
+                self._send_messages(self.outgoing_queue.get_all())
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, socket.cancel_wait_ex):
+            # Either the connection was closed by the other side, in which
+            # case the reader will notice it, or it was aborted by close
+            pass
+        finally:
+            self.flusher = None
+        if self.closing:
+            self._close()
+
+    def close(self, exception=None, abort=False):
+        """
+        Close the connection of a writer that sends directly, after sending
+        what is left to send unless abort is set
+        """
+        self.closing = True
+        self.close_exception = exception
+        if abort:
+            self.outgoing_queue.clear()
+        if self.flusher is None or abort:
+            self._close()
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.sock.close()
+        if self.close_exception:
+            self.logger.error('%s(%s): connection closed because of an exception' % (self.task_name, self.task_id),
+                              exc_info=self.close_exception)
+        else:
+            self.logger.info('%s(%s): writer closed the connection' % (self.task_name, self.task_id))
+
     def encode(self, msg):
         """ Encode msg into a series of bytes """
         raise NotImplementedError('encode must be implemented in a subclass of ConnectionWriter')
 
+    def message_size(self, msg):
+        """ Estimate of the number of bytes msg will take once encoded, for the outgoing byte limit """
+        return 0
+
     def send(self, msg_bytes):
         """ Send the bytes that make up a message out over the socket """
         raise NotImplementedError('send must be implemented in a subclass of ConnectionWriter')
 
+    def send_many(self, msg_bytes_list):
+        """ Send the bytes of several messages out over the socket """
+        for msg_bytes in msg_bytes_list:
+            self.send(msg_bytes)
+
+    def send_many_nowait(self, msg_bytes_list):
+        """
+        Send the bytes of several messages as far as possible without waiting
+        and return False if flush needs to be called to send the rest
+        """
+        raise NotImplementedError('send_many_nowait must be implemented in a subclass of ConnectionWriter '
+                                  'to be able to send directly')
+
+    def flush(self):
+        """ Send whatever send_many_nowait left to be sent """
+        raise NotImplementedError('flush must be implemented in a subclass of ConnectionWriter '
+                                  'to be able to send directly')
+
+    def backlog_size(self):
+        """ Number of messages that send_many_nowait left to be sent """
+        raise NotImplementedError('backlog_size must be implemented in a subclass of ConnectionWriter '
+                                  'to be able to send directly')
+
 
 class TcpMessageConnectionWriter(ConnectionWriter):
     def __init__(self, sock, max_message_size = 0xFFFF, dump_queue = None):
@@ -131,28 +292,138 @@ class TcpMessageConnectionWriter(ConnectionWriter):
     def send(self, msg_bytes):
         return self.tcp_writer.send(msg_bytes)
 
+    def send_many(self, msg_bytes_list):
+        return self.tcp_writer.send_many(msg_bytes_list)
+
+    def send_many_nowait(self, msg_bytes_list):
+        return self.tcp_writer.send_many_nowait(msg_bytes_list)
+
+    def flush(self):
+        return self.tcp_writer.flush()
+
+    def backlog_size(self):
+        return self.tcp_writer.backlog_size()
+
 
 class Peer:
     def __init__(self):
         self.task_name = None
         self.task_id = None
         self.outgoing_queue = None
+        self.sock = None
+        # Only set for connections that send directly instead of through the outgoing queue
+        self.writer = None
+        self.disconnecting = False
+
+    def send(self, msg, droppable=False, replace_key=None):
+        """
+        Send msg to the peer. A message that is droppable may be dropped and
+        one with a replace_key may be replaced by a newer message with the
+        same key if the peer falls behind, depending on the overflow policy
+        of the connection. If the peer falls too far behind, it is
+        disconnected.
+        """
+        if self.disconnecting:
+            return
+        trace = latencytracing.active_trace
+        if trace is not None:
+            msg = latencytracing.TracedMessage(msg, trace)
+        if self.writer and self.writer.can_write:
+            self.writer.write(msg)
+        elif not self.outgoing_queue.put(msg, droppable, replace_key):
+            self.disconnect(OutgoingQueueOverflowError('%s(%s) fell too far behind in receiving messages' %
+                                                       (self.task_name, self.task_id)),
+                            abort=True)
+
+    def disconnect(self, exception=None, abort=False):
+        """ Disconnect the peer after sending it what is left to send, unless abort is set """
+        if self.disconnecting:
+            return
+        self.disconnecting = True
+        if self.writer:
+            self.writer.close(exception, abort)
+        else:
+            if abort:
+                self.outgoing_queue.clear()
+            self.outgoing_queue.put_unlimited(PeerDisconnectedMessage(self, exception))
+            if abort:
+                # The writer may be stuck sending to a peer that does not
+                # read, so close the socket to make both the writer and the
+                # reader give up on it right away
+                self.sock.close()
 
-    def send(self, msg):
-        self.outgoing_queue.put(msg)
+    def outgoing_queue_size(self):
+        """ Number of messages that have been sent to this peer, but not yet written to its connection """
+        if self.writer:
+            return self.writer.backlog_size() + self.outgoing_queue.qsize()
+        return self.outgoing_queue.qsize()
+
+
+class GeventTransport:
+    """
+    Serves and makes connections with gevent's sockets. With reuse_port,
+    several processes can serve the same port and the kernel spreads the
+    incoming connections between them.
+    """
+    def __init__(self, reuse_port=False):
+        self.reuse_port = reuse_port
+
+    def serve(self, address, port, handle):
+        if self.reuse_port:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            listener.bind((address, port))
+            listener.listen(gevent.server.StreamServer.backlog)
+            server = gevent.server.StreamServer(listener, handle)
+        else:
+            server = gevent.server.StreamServer((address, port), handle)
+        server.serve_forever()
+
+    def connect(self, address, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect((address, port))
+        except BaseException:
+            sock.close()
+            raise
+        return sock
 
-    def disconnect(self, exception=None):
-        self.outgoing_queue.put(PeerDisconnectedMessage(self, exception))
+
+def _unwrapped_message_size(writer):
+    def message_size(msg):
+        if type(msg) is latencytracing.TracedMessage:
+            msg = msg.message
+        return writer.message_size(msg)
+    return message_size
 
 
 class ConnectionHandler:
-    def __init__(self, task_name, address, port, incoming_queue):
+    """
+    Sets up the reader, writer and peer of each connection.
+
+    By default a connection is served by a reader and a writer greenlet,
+    with the messages for the writer going through an outgoing queue. With
+    direct_send, the reader runs in the greenlet that handles the connection
+    and messages are written to the socket by whoever sends them. A greenlet
+    to write the rest is only spawned when the socket's send buffer is full.
+
+    Either way, outgoing_limits bound what may wait to be sent to each peer.
+
+    The sockets themselves come from the transport, which is gevent's unless
+    another one such as the AsyncioTransport is passed in.
+    """
+    def __init__(self, task_name, address, port, incoming_queue, direct_send=False, outgoing_limits=None,
+                 transport=None):
         self.logger = logging.getLogger(__name__)
         gevent.getcurrent().name = task_name
         self.task_name = task_name
         self.address = address
         self.port = port
         self.incoming_queue = incoming_queue
+        self.direct_send = direct_send
+        self.outgoing_limits = outgoing_limits if outgoing_limits is not None else OutgoingLimits()
+        self.transport = transport if transport is not None else GeventTransport()
 
     def run(self):
         raise NotImplementedError('ConnectionHandler should not be used directly. '
@@ -181,11 +452,9 @@ class ConnectionHandler:
                             'and the type is the only way to distinguish between messages from '
                             'different ConnectionHandlers.')
 
-        outgoing_queue = gevent.queue.Queue()
-
         peer.task_id = task_id
         peer.task_name = self.task_name
-        peer.outgoing_queue = outgoing_queue
+        peer.sock = sock
 
         reader.task_id = task_id
         reader.task_name = self.task_name
@@ -194,8 +463,18 @@ class ConnectionHandler:
 
         writer.task_id = task_id
         writer.task_name = self.task_name
+
+        outgoing_queue = OutgoingQueue(self.task_name,
+                                       self.outgoing_limits,
+                                       _unwrapped_message_size(writer))
+        peer.outgoing_queue = outgoing_queue
         writer.outgoing_queue = outgoing_queue
 
+        if self.direct_send:
+            peer.writer = writer
+            reader.run()
+            return
+
         tasks = [
             gevent_spawn("%s(%s)'s reader" % (self.task_name, task_id), reader.run),
             gevent_spawn("%s(%s)'s writer" % (self.task_name, task_id), writer.run)
@@ -213,9 +492,8 @@ class ConnectionHandler:
 
 class IncomingConnectionHandler(ConnectionHandler):
     def run(self):
-        server = gevent.server.StreamServer((self.address, self.port), self._handle_and_catch)
         try:
-            server.serve_forever()
+            self.transport.serve(self.address, self.port, self._handle_and_catch)
         except OSError as e:
             if e.errno == 10048:
                 raise PortInUseError('tcp', self.address, self.port)
@@ -230,8 +508,7 @@ class OutgoingConnectionHandler(ConnectionHandler):
         try:
             while True:
                 try:
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                        sock.connect((self.address, self.port))
+                    with self.transport.connect(self.address, self.port) as sock:
                         self._handle(sock, (str(self.address), self.port))
                         break
                 except (ConnectionRefusedError, TimeoutError) as e:
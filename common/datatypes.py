@@ -23,6 +23,14 @@ import struct
 from ipaddress import IPv4Address
 
 
+_short_struct = struct.Struct('<H')
+_long_struct = struct.Struct('<L')
+_ident_byte_struct = struct.Struct('<HB')
+_ident_short_struct = struct.Struct('<HH')
+_ident_long_struct = struct.Struct('<HL')
+_nbytes_structs = {}
+
+
 class AlreadyLoggedInError(Exception):
     pass
 
@@ -61,17 +69,67 @@ def _originalbytes(start, end):
 
 
 def findbytype(arr, requestedtype):
+    if isinstance(arr, enumblockarray):
+        return arr.findbytype(requestedtype)
     for item in arr:
         if type(item) == requestedtype:
             return item
     return None
 
 
+class ByteReader:
+    """
+    Read cursor over bytes that are already in memory. It provides the read
+    and peek methods that the read methods of the enumfields expect.
+    """
+    def __init__(self, buffer=b'', position=0):
+        self.buffer = buffer
+        self.position = position
+
+    def available(self):
+        return len(self.buffer) - self.position
+
+    def prepare(self, length):
+        ''' Makes sure that at least length bytes are available in self.buffer '''
+        if self.available() < length:
+            raise EOFError
+
+    def read(self, length):
+        self.prepare(length)
+        start = self.position
+        self.position += length
+        return bytes(self.buffer[start:self.position])
+
+    def peek(self, length):
+        self.prepare(length)
+        return bytes(self.buffer[self.position:self.position + length])
+
+    def tell(self):
+        return self.position
+
+
 # ------------------------------------------------------------
 # base types
 # ------------------------------------------------------------
 
-class onebyte():
+class _EnumFieldType(type):
+    """
+    Metaclass of all enumfields. It gives every enumfield class that does not
+    define __slots__ itself an empty one, so that none of the many small
+    instances that decoding creates carry a per-instance __dict__.
+    """
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault('__slots__', ())
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class enumfield(metaclass=_EnumFieldType):
+    __slots__ = ('ident',)
+
+
+class onebyte(enumfield):
+    __slots__ = ('value',)
+
     def __init__(self, ident, value=0):
         self.ident = ident
         self.value = value
@@ -83,6 +141,16 @@ class onebyte():
     def write(self, stream):
         stream.write(struct.pack('<HB', self.ident, self.value))
 
+    def size(self):
+        return 3
+
+    def write_into(self, buffer, offset):
+        _ident_byte_struct.pack_into(buffer, offset, self.ident, self.value)
+        return offset + 3
+
+    def wire_length(self, buffer, offset, end):
+        return 3
+
     def read(self, stream):
         ident, value = struct.unpack('<HB', stream.read(3))
         if ident != self.ident:
@@ -91,7 +159,9 @@ class onebyte():
         return self
 
 
-class twobytes():
+class twobytes(enumfield):
+    __slots__ = ('value',)
+
     def __init__(self, ident, value=0):
         self.ident = ident
         self.value = value
@@ -104,6 +174,16 @@ class twobytes():
     def write(self, stream):
         stream.write(struct.pack('<HH', self.ident, self.value))
 
+    def size(self):
+        return 4
+
+    def write_into(self, buffer, offset):
+        _ident_short_struct.pack_into(buffer, offset, self.ident, self.value)
+        return offset + 4
+
+    def wire_length(self, buffer, offset, end):
+        return 4
+
     def read(self, stream):
         ident, value = struct.unpack('<HH', stream.read(4))
         if ident != self.ident:
@@ -112,7 +192,9 @@ class twobytes():
         return self
 
 
-class fourbytes():
+class fourbytes(enumfield):
+    __slots__ = ('value',)
+
     def __init__(self, ident, value=0):
         self.ident = ident
         self.value = value
@@ -125,6 +207,16 @@ class fourbytes():
     def write(self, stream):
         stream.write(struct.pack('<HL', self.ident, self.value))
 
+    def size(self):
+        return 6
+
+    def write_into(self, buffer, offset):
+        _ident_long_struct.pack_into(buffer, offset, self.ident, self.value)
+        return offset + 6
+
+    def wire_length(self, buffer, offset, end):
+        return 6
+
     def read(self, stream):
         ident, value = struct.unpack('<HL', stream.read(6))
         if ident != self.ident:
@@ -133,7 +225,9 @@ class fourbytes():
         return self
 
 
-class nbytes():
+class nbytes(enumfield):
+    __slots__ = ('value',)
+
     def __init__(self, ident, valuebytes):
         self.ident = ident
         self.value = valuebytes
@@ -146,6 +240,21 @@ class nbytes():
     def write(self, stream):
         stream.write(struct.pack('<H', self.ident) + self.value)
 
+    def size(self):
+        return 2 + len(self.value)
+
+    def write_into(self, buffer, offset):
+        # The length of the value is fixed for each nbytes field
+        length = len(self.value)
+        nbytes_struct = _nbytes_structs.get(length)
+        if nbytes_struct is None:
+            nbytes_struct = _nbytes_structs[length] = struct.Struct('<H%ds' % length)
+        nbytes_struct.pack_into(buffer, offset, self.ident, self.value)
+        return offset + 2 + length
+
+    def wire_length(self, buffer, offset, end):
+        return 2 + len(self.value)
+
     def read(self, stream):
         ident = struct.unpack('<H', stream.read(2))[0]
         if ident != self.ident:
@@ -154,7 +263,9 @@ class nbytes():
         return self
 
 
-class stringenum():
+class stringenum(enumfield):
+    __slots__ = ('value',)
+
     def __init__(self, ident, value=''):
         self.ident = ident
         self.value = value
@@ -168,6 +279,22 @@ class stringenum():
     def write(self, stream):
         stream.write(struct.pack('<HH', self.ident, len(self.value)) + self.value.encode('latin1'))
 
+    def size(self):
+        return 4 + len(self.value)
+
+    def write_into(self, buffer, offset):
+        length = len(self.value)
+        _ident_short_struct.pack_into(buffer, offset, self.ident, length)
+        offset += 4
+        end = offset + length
+        buffer[offset:end] = self.value.encode('latin1')
+        return end
+
+    def wire_length(self, buffer, offset, end):
+        if end - offset < 4:
+            return None
+        return 4 + _short_struct.unpack_from(buffer, offset + 2)[0]
+
     def read(self, stream):
         ident, length = struct.unpack('<HH', stream.read(4))
         if ident != self.ident:
@@ -176,7 +303,15 @@ class stringenum():
         return self
 
 
-class arrayofenumblockarrays():
+class arrayofenumblockarrays(enumfield):
+    """
+    An enumfield containing a list of lists of other enumfields.
+
+    When setting the contents, any of the inner lists may instead be given as
+    bytes that already hold its encoding, including its length.
+    """
+    __slots__ = ('arrays', 'original_bytes')
+
     def __init__(self, ident):
         self.ident = ident
         self.arrays = []
@@ -198,10 +333,47 @@ class arrayofenumblockarrays():
         else:
             stream.write(struct.pack('<HH', self.ident, len(self.arrays)))
             for arr in self.arrays:
+                if isinstance(arr, (bytes, bytearray)):
+                    stream.write(arr)
+                    continue
                 stream.write(struct.pack('<H', len(arr)))
                 for enumfield in arr:
                     enumfield.write(stream)
 
+    def size(self):
+        if self.original_bytes:
+            return self.original_bytes[1] - self.original_bytes[0]
+        size = 4
+        for arr in self.arrays:
+            if isinstance(arr, (bytes, bytearray)):
+                size += len(arr)
+                continue
+            size += 2
+            for enumfield in arr:
+                size += enumfield.size()
+        return size
+
+    def write_into(self, buffer, offset):
+        if self.original_bytes:
+            original_bytes = _originalbytes(*self.original_bytes)
+            end = offset + len(original_bytes)
+            buffer[offset:end] = original_bytes
+            return end
+        _ident_short_struct.pack_into(buffer, offset, self.ident, len(self.arrays))
+        offset += 4
+        pack_length_into = _short_struct.pack_into
+        for arr in self.arrays:
+            if isinstance(arr, (bytes, bytearray)):
+                end = offset + len(arr)
+                buffer[offset:end] = arr
+                offset = end
+                continue
+            pack_length_into(buffer, offset, len(arr))
+            offset += 2
+            for enumfield in arr:
+                offset = enumfield.write_into(buffer, offset)
+        return offset
+
     def read(self, stream):
         ident, length1 = struct.unpack('<HH', stream.read(4))
         if ident != self.ident:
@@ -211,48 +383,155 @@ class arrayofenumblockarrays():
             innerarray = []
             length2 = struct.unpack('<H', stream.read(2))[0]
             for _ in range(length2):
-                enumid = struct.unpack('<H', stream.peek(2))[0]
-                classname = ('m%04X' % enumid).lower()
-                element = globals()[classname]().read(stream)
+                enumid = _short_struct.unpack(stream.peek(2))[0]
+                element = nested_classes[enumid]().read(stream)
                 innerarray.append(element)
             self.arrays.append(innerarray)
         return self
 
 
-class enumblockarray():
+class enumblockarray(enumfield):
+    """
+    An enumfield containing a list of other enumfields.
+
+    When read with read_lazily, only the positions of the contained enumfields
+    within the received bytes are recorded. Each of them is decoded when it is
+    first accessed, through content or findbytype.
+
+    Lookups by type go through an index from ident to positions in content,
+    which is built while reading or on the first lookup after a change. As
+    content is a list that the caller may modify in place, getting it drops
+    the index.
+    """
+    __slots__ = ('_content', '_raw', '_offsets', '_index')
+
     def __init__(self, ident):
         self.ident = ident
-        self.content = []
+        self._content = []
+        self._raw = None
+        self._offsets = None
+        self._index = None
+
+    @property
+    def content(self):
+        self._index = None
+        return self._decoded_content()
+
+    def _decoded_content(self):
+        if self._raw is not None:
+            for i, element in enumerate(self._content):
+                if element is None:
+                    self._decode_element(i)
+            self._raw = None
+            self._offsets = None
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = list(content)
+        self._raw = None
+        self._offsets = None
+        self._index = None
+
+    def _decode_element(self, i):
+        stream = ByteReader(self._raw, self._offsets[i])
+        enumid = _short_struct.unpack(stream.peek(2))[0]
+        element = nested_classes[enumid]().read(stream)
+        self._content[i] = element
+        return element
+
+    def _build_index(self, idents):
+        index = {}
+        for i, ident in enumerate(idents):
+            if ident in index:
+                index[ident].append(i)
+            else:
+                index[ident] = [i]
+        self._index = index
+
+    def findallbytype(self, requestedtype):
+        if self._index is None:
+            self._build_index([element.ident for element in self._decoded_content()])
+
+        matches = []
+        for i in self._index.get(enumfield_idents.get(requestedtype), ()):
+            element = self._content[i]
+            if element is None:
+                element = self._decode_element(i)
+            if type(element) == requestedtype:
+                matches.append(element)
+        return matches
 
     def findbytype(self, requestedtype):
-        for item in self.content:
-            if type(item) == requestedtype:
-                return item
-        return None
+        matches = self.findallbytype(requestedtype)
+        return matches[0] if matches else None
+
+    def extract(self, *requestedtypes):
+        """ Returns a tuple with the first element of each of the requested types, or None for missing ones """
+        return tuple(self.findbytype(requestedtype) for requestedtype in requestedtypes)
 
     def set(self, content):
         self.content = content
         return self
 
     def write(self, stream):
-        stream.write(struct.pack('<HH', self.ident, len(self.content)))
-        for el in self.content:
+        content = self._decoded_content()
+        stream.write(struct.pack('<HH', self.ident, len(content)))
+        for el in content:
             el.write(stream)
 
+    def size(self):
+        size = 4
+        for el in self._decoded_content():
+            size += el.size()
+        return size
+
+    def write_into(self, buffer, offset):
+        content = self._decoded_content()
+        _ident_short_struct.pack_into(buffer, offset, self.ident, len(content))
+        offset += 4
+        for el in content:
+            offset = el.write_into(buffer, offset)
+        return offset
+
     def read(self, stream):
         ident, length = struct.unpack('<HH', stream.read(4))
         if ident != self.ident:
             raise ParseError('self.ident(%02X) did not match parsed ident value (%02X)' % (self.ident, ident))
-        self.content = []
+        content = []
+        idents = []
         for i in range(length):
-            enumid = struct.unpack('<H', stream.peek(2))[0]
-            classname = ('m%04X' % enumid).lower()
-            element = globals()[classname]().read(stream)
-            self.content.append(element)
+            enumid = _short_struct.unpack(stream.peek(2))[0]
+            element = nested_classes[enumid]().read(stream)
+            content.append(element)
+            idents.append(enumid)
+        self.content = content
+        self._build_index(idents)
         return self
 
+    def read_lazily(self, stream):
+        ident, length = struct.unpack('<HH', stream.read(4))
+        if ident != self.ident:
+            raise ParseError('self.ident(%02X) did not match parsed ident value (%02X)' % (self.ident, ident))
+
+        buffer = stream.buffer
+        start = stream.tell()
+        end = start
+        offsets = []
+        for i in range(length):
+            offsets.append(end - start)
+            end = _enumfield_end(buffer, end, len(buffer))
+
+        self._content = [None] * length
+        self._raw = stream.read(end - start)
+        self._offsets = offsets
+        self._build_index([_short_struct.unpack_from(self._raw, offset)[0] for offset in offsets])
+        return self
+
+
+class variablelengthbytes(enumfield):
+    __slots__ = ('content',)
 
-class variablelengthbytes():
     def __init__(self, ident, content=b''):
         self.ident = ident
         self.content = content
@@ -264,6 +543,22 @@ class variablelengthbytes():
     def write(self, stream):
         stream.write(struct.pack('<HL', self.ident, len(self.content)) + self.content)
 
+    def size(self):
+        return 6 + len(self.content)
+
+    def write_into(self, buffer, offset):
+        length = len(self.content)
+        _ident_long_struct.pack_into(buffer, offset, self.ident, length)
+        offset += 6
+        end = offset + length
+        buffer[offset:end] = self.content
+        return end
+
+    def wire_length(self, buffer, offset, end):
+        if end - offset < 6:
+            return None
+        return 6 + _long_struct.unpack_from(buffer, offset + 2)[0]
+
     def read(self, stream):
         ident, length = struct.unpack('<HL', stream.read(6))
         if ident != self.ident:
@@ -277,6 +572,22 @@ class passwordlike(variablelengthbytes):
     def write(self, stream):
         stream.write(struct.pack('<HH', self.ident, len(self.content)) + self.content)
 
+    def size(self):
+        return 4 + len(self.content)
+
+    def write_into(self, buffer, offset):
+        length = len(self.content)
+        _ident_short_struct.pack_into(buffer, offset, self.ident, length)
+        offset += 4
+        end = offset + length
+        buffer[offset:end] = self.content
+        return end
+
+    def wire_length(self, buffer, offset, end):
+        if end - offset < 4:
+            return None
+        return 4 + (_short_struct.unpack_from(buffer, offset + 2)[0] & 0x7FFF) * 2
+
     def read(self, stream):
         ident, length = struct.unpack('<HH', stream.read(4))
         # Length is actually doubled due to server pass's interspersed bytes
@@ -1111,12 +1422,26 @@ class m00e9(arrayofenumblockarrays):
         super().__init__(0x00e9)
 
     def setservers(self, servers, player_address):
-        self.arrays = []
-        for server in servers:
-            if not server.joinable:
-                continue
+        self.arrays = [m00e9.server_fields(server, player_address) for server in servers if server.joinable]
+        return self
 
-            self.arrays.append([
+    @staticmethod
+    def server_fields(server, player_address):
+        """ Returns the fields describing a server in a server list as seen from player_address """
+        fields_before_time_remaining, fields_after_time_remaining = m00e9.traced_server_fields(server)
+        return (fields_before_time_remaining +
+                [m00e9.time_remaining_field(server)] +
+                fields_after_time_remaining +
+                [m00e9.server_address_field(server, player_address)])
+
+    @staticmethod
+    def traced_server_fields(server):
+        """
+        Returns the fields describing a server in a server list that only
+        change along with the traced state of the server, as the fields before
+        and the fields after the one holding its time remaining
+        """
+        return ([
                 m0385(),
                 m06ee(),
                 m02c7().set(server.server_id),
@@ -1150,13 +1475,31 @@ class m00e9(arrayofenumblockarrays):
                 m02b2().set(server.map_id),
                 m02b5(),
                 m0347().set(0x00000018),
-                m02f4().set(server.get_time_remaining()),
+            ], [
                 m0035().set(server.be_score),
                 m0197().set(server.ds_score),
-                m0246().set(server.address_pair.get_address_seen_from(player_address), server.pingport)
-                                                # The value doesn't matter, the client uses the address in a0035
             ])
-        return self
+
+    @staticmethod
+    def time_remaining_field(server):
+        return m02f4().set(server.get_time_remaining())
+
+    @staticmethod
+    def server_address_field(server, player_address):
+        # The value doesn't matter, the client uses the address in a0035
+        return m0246().set(server.address_pair.get_address_seen_from(player_address), server.pingport)
+
+    @staticmethod
+    def encode_traced_server_fields(server):
+        """
+        Returns the encodings of the two lists of traced_server_fields, where
+        the first one is preceded by the length of the inner array of m00e9
+        that they are part of
+        """
+        fields_before_time_remaining, fields_after_time_remaining = m00e9.traced_server_fields(server)
+        length = len(fields_before_time_remaining) + len(fields_after_time_remaining) + 2
+        return (_short_struct.pack(length) + encode_enumfields(fields_before_time_remaining),
+                encode_enumfields(fields_after_time_remaining))
 
     def setplayers(self, players):
         assert len(self.arrays) == 1, 'Can only set players for an m00e9 message that contains a single server'
@@ -1203,19 +1546,161 @@ class originalfragment():
     def write(self, stream):
         stream.write(_originalbytes(self.fromoffset, self.tooffset))
 
+    def size(self):
+        return self.tooffset - self.fromoffset
 
-def construct_top_level_enumfield(stream):
-    ident = struct.unpack('<H', stream.peek(2))[0]
-    classname_a = ('a%04X' % ident).lower()
-    classname_m = ('m%04X' % ident).lower()
+    def write_into(self, buffer, offset):
+        end = offset + self.tooffset - self.fromoffset
+        buffer[offset:end] = _originalbytes(self.fromoffset, self.tooffset)
+        return end
 
-    if classname_a not in globals():
-        if classname_m not in globals():
-            raise RuntimeError(f'Unable to parse enumfield {ident:04x}')
-        else:
-            messageclass = classname_m
+
+def encode_enumfields(fields):
+    """
+    Encode a list of enumfields
+
+    The size of the encoded fields is computed first, so that they can all be
+    packed into a single preallocated buffer with the precompiled struct of
+    each kind of field.
+    """
+    buffer = bytearray(sum(field.size() for field in fields))
+    view = memoryview(buffer)
+    offset = 0
+    for field in fields:
+        offset = field.write_into(view, offset)
+    view.release()
+    return buffer
+
+
+def _build_registry(prefix):
+    registry = {}
+    for name, obj in list(globals().items()):
+        if len(name) == 5 and name[0] == prefix and isinstance(obj, type) and issubclass(obj, enumfield):
+            registry[int(name[1:], 16)] = obj
+    return registry
+
+
+# Classes of all known enumfields by ident, for the top-level (aXXXX) and
+# nested (mXXXX) namespaces. An ident that is not in the top-level namespace
+# can still appear at the top level as an mXXXX enumfield.
+top_level_classes = _build_registry('a')
+nested_classes = _build_registry('m')
+enumfield_idents = {cls: ident for registry in (nested_classes, top_level_classes) for ident, cls in registry.items()}
+_top_level_lookup = {**nested_classes, **top_level_classes}
+
+
+def enumfield_class(ident, top_level):
+    try:
+        return _top_level_lookup[ident] if top_level else nested_classes[ident]
+    except KeyError:
+        raise RuntimeError(f'Unable to parse enumfield {ident:04x}')
+
+
+# One instance of every known enumfield, used when scanning
+_top_level_prototypes = {ident: cls() for ident, cls in _top_level_lookup.items()}
+_nested_prototypes = {ident: cls() for ident, cls in nested_classes.items()}
+
+
+def _prototype(ident, top_level):
+    try:
+        return _top_level_prototypes[ident] if top_level else _nested_prototypes[ident]
+    except KeyError:
+        raise RuntimeError(f'Unable to parse enumfield {ident:04x}')
+
+
+def _enumfield_end(buffer, offset, end):
+    """ Returns the offset just past the nested enumfield that starts at offset in buffer """
+    if end - offset < 2:
+        raise ParseError('Enumfield extends beyond the end of the data')
+    field = _prototype(_short_struct.unpack_from(buffer, offset)[0], top_level=False)
+    if isinstance(field, (enumblockarray, arrayofenumblockarrays)):
+        length = FieldScanner(top_level=False).scan(buffer, offset, end)
     else:
-        messageclass = classname_a
+        length = field.wire_length(buffer, offset, end)
+    if length is None or end - offset < length:
+        raise ParseError('Enumfield extends beyond the end of the data')
+    return offset + length
 
-    obj = globals()[messageclass]().read(stream)
-    return obj
+
+def construct_top_level_enumfield(stream, lazy=False):
+    ident = _short_struct.unpack(stream.peek(2))[0]
+    obj = enumfield_class(ident, top_level=True)()
+    if lazy and isinstance(obj, enumblockarray):
+        return obj.read_lazily(stream)
+    else:
+        return obj.read(stream)
+
+
+class FieldScanner:
+    """
+    Determines where an enumfield ends without decoding it.
+
+    The buffer being scanned may still be incomplete. In that case the scanner
+    remembers how far it got, so that the next call to scan can resume from
+    there once more data has been added to the buffer.
+    """
+    def __init__(self, top_level=True):
+        self.top_level = top_level
+        self.reset()
+
+    def reset(self):
+        self.length = 0
+        self.started = False
+        # One [remaining count, counts inner arrays] entry for every container being scanned
+        self.pending = []
+
+    def scan(self, buffer, start, end):
+        """
+        Scan the enumfield that starts at offset start in buffer
+
+        :returns: the length of the enumfield if it is complete, otherwise None
+        """
+        pending = self.pending
+        position = start + self.length
+
+        while True:
+            if pending:
+                container = pending[-1]
+                if container[0] == 0:
+                    pending.pop()
+                    continue
+
+                if container[1]:
+                    # Next up is the length of one of the arrays in an arrayofenumblockarrays
+                    if end - position < 2:
+                        return None
+                    container[0] -= 1
+                    pending.append([_short_struct.unpack_from(buffer, position)[0], False])
+                    position += 2
+                    self.length = position - start
+                    continue
+
+            elif self.started:
+                length = self.length
+                self.reset()
+                return length
+
+            if end - position < 2:
+                return None
+            ident = _short_struct.unpack_from(buffer, position)[0]
+            field = _prototype(ident, top_level=self.top_level and not self.started)
+
+            if isinstance(field, (enumblockarray, arrayofenumblockarrays)):
+                if end - position < 4:
+                    return None
+                new_container = [_short_struct.unpack_from(buffer, position + 2)[0],
+                                 isinstance(field, arrayofenumblockarrays)]
+                position += 4
+            else:
+                length = field.wire_length(buffer, position, end)
+                if length is None or end - position < length:
+                    return None
+                new_container = None
+                position += length
+
+            if pending:
+                pending[-1][0] -= 1
+            if new_container:
+                pending.append(new_container)
+            self.started = True
+            self.length = position - start
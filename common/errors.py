@@ -30,3 +30,11 @@ class MajorError(Exception):
 class PortInUseError(FatalError):
     def __init__(self, protocol: str, address: str, port: int):
         super().__init__('Port %s:%d/%s is already in use on this machine' % (address, port, protocol))
+
+
+class OutgoingQueueOverflowError(Exception):
+    pass
+
+
+class CodecProcessExitedError(Exception):
+    pass
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Sampled tracing of how long requests spend in each stage on their way
+through the server, from being decoded to the replies they cause being
+written to a socket.
+
+A trace is started for a fraction of the received messages, given by the
+sample rate. While the server handles a traced message, the trace is the
+active trace, and every message sent to a peer in that time carries it to
+the peer's writer. All stage durations end up in a histogram broken down by
+the ident of the request and the stage.
+"""
+
+import random
+import time
+
+from common.metrics import Histogram
+
+stage_seconds = Histogram('gaserver_request_stage_seconds',
+                          'Time sampled requests spent in each stage, by request ident.',
+                          ['ident', 'stage'])
+
+sample_rate = 0.0
+
+# The trace of the message that is currently being handled, if it is sampled
+active_trace = None
+
+
+def set_sample_rate(rate):
+    global sample_rate
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError('The sample rate must be between 0 and 1')
+    sample_rate = rate
+
+
+def start_trace():
+    """ Returns a new trace starting now for the sampled fraction of calls, or None """
+    if sample_rate and random.random() < sample_rate:
+        return RequestTrace(time.perf_counter())
+    return None
+
+
+class RequestTrace:
+    __slots__ = ('start_time', 'stage_start_time', 'idents')
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.stage_start_time = start_time
+        self.idents = ()
+
+    def end_stage(self, stage, idents=None):
+        """
+        Records the time since the end of the previous stage for the given
+        idents, or for all idents of the traced message if none are given
+        """
+        now = time.perf_counter()
+        duration = now - self.stage_start_time
+        self.stage_start_time = now
+        for ident in (idents if idents is not None else self.idents):
+            stage_seconds.observe(duration, ('a%04x' % ident, stage))
+
+
+class TracedMessage:
+    """ Wraps a message on its way to a peer's writer along with the trace of the request that caused it """
+    __slots__ = ('message', 'trace', 'sent_time')
+
+    def __init__(self, message, trace):
+        self.message = message
+        self.trace = trace
+        self.sent_time = time.perf_counter()
+
+    def record_outgoing(self, dequeued_time, encode_duration, write_duration, written_time):
+        """ Records the stages in the writer, where the message is written to the socket along with others """
+        for ident in self.trace.idents:
+            ident_label = 'a%04x' % ident
+            stage_seconds.observe(dequeued_time - self.sent_time, (ident_label, 'outgoing_queue_wait'))
+            stage_seconds.observe(encode_duration, (ident_label, 'encode'))
+            stage_seconds.observe(write_duration, (ident_label, 'socket_write'))
+            stage_seconds.observe(written_time - self.trace.start_time, (ident_label, 'total'))
@@ -22,7 +22,8 @@ import io
 import struct
 
 from common.connectionhandler import *
-from .datatypes import construct_top_level_enumfield
+from common import latencytracing
+from .datatypes import construct_top_level_enumfield, encode_enumfields, ByteReader, FieldScanner
 
 
 def peekshort(infile):
@@ -45,57 +46,120 @@ def parseseqack(infile):
     return seq, ack
 
 
-class PacketReader:
-    def __init__(self, receive_func):
-        self.buffer = bytes()
+class PacketReader(ByteReader):
+    """
+    Reassembly buffer for the bytes of the login protocol stream.
+
+    Reading advances a cursor instead of slicing off the front of the buffer.
+    The consumed part of the buffer is only discarded when new data is added
+    and it makes up at least half of the buffer.
+    """
+    def __init__(self, receive_func=None):
+        super().__init__(bytearray())
         self.receive_func = receive_func
 
+    def feed(self, data):
+        if self.position and self.position * 2 >= len(self.buffer):
+            del self.buffer[:self.position]
+            self.position = 0
+        self.buffer += data
+
     def prepare(self, length):
         ''' Makes sure that at least length bytes are available in self.buffer '''
-        while len(self.buffer) < length:
-            message_data = self.receive_func()
-            self.buffer += message_data
+        while self.available() < length:
+            if self.receive_func is None:
+                raise EOFError
+            self.feed(self.receive_func())
 
-    def read(self, length):
-        self.prepare(length)
-        requestedbytes = self.buffer[:length]
-        self.buffer = self.buffer[length:]
-        return requestedbytes
 
-    def peek(self, length):
-        self.prepare(length)
-        requestedbytes = self.buffer[:length]
-        return requestedbytes
+def decode_fields(data, lazy=False):
+    """
+    Decode all top-level enumfields contained in data
 
-    def tell(self):
-        return 0
+    :param lazy: only decode the contents of enumblockarrays when they are accessed
+    """
+    stream = ByteReader(data)
+    fields = []
+    while stream.available():
+        fields.append(construct_top_level_enumfield(stream, lazy))
+    return fields
 
 
 class StreamParser:
-    def __init__(self, in_stream):
-        self.in_stream = in_stream
+    """
+    Incremental parser for the login protocol byte stream that does not do any
+    I/O itself. Data is added with feed as it arrives and complete top-level
+    enumfields can be taken out as soon as all of their bytes are there.
+    A partially received enumfield is never decoded, so decoding never has
+    to wait for more data.
+    """
+    def __init__(self):
+        self.in_stream = PacketReader()
+        self.scanner = FieldScanner()
+
+    def feed(self, data):
+        self.in_stream.feed(data)
+
+    def next_field_bytes(self):
+        """ Returns the bytes of the next top-level enumfield or None if it has not been received completely yet """
+        length = self.scanner.scan(self.in_stream.buffer, self.in_stream.position, len(self.in_stream.buffer))
+        if length is None:
+            return None
+        return self.in_stream.read(length)
+
+    def complete_fields_bytes(self):
+        """ Returns the bytes of all top-level enumfields that have been received completely """
+        buffer = self.in_stream.buffer
+        start = self.in_stream.position
+        total_length = 0
+        length = self.scanner.scan(buffer, start, len(buffer))
+        while length is not None:
+            total_length += length
+            length = self.scanner.scan(buffer, start + total_length, len(buffer))
+        return self.in_stream.read(total_length)
 
     def parse(self):
-        return [construct_top_level_enumfield(self.in_stream)]
+        """ Returns all top-level enumfields that have been received completely """
+        fields = []
+        while self.scanner.scan(self.in_stream.buffer, self.in_stream.position, len(self.in_stream.buffer)) is not None:
+            fields.append(construct_top_level_enumfield(self.in_stream))
+        return fields
 
 
 class LoginProtocolMessage:
-    def __init__(self, requests):
+    def __init__(self, requests, trace=None):
         self.requests = requests
+        self.trace = trace
 
 
-class LoginProtocolReader(TcpMessageConnectionReader):
-    def __init__(self, sock, dump_queue):
+class LoginProtocolReader(BufferedTcpMessageConnectionReader):
+    def __init__(self, sock, dump_queue, codec_pool = None):
         super().__init__(sock, max_message_size = 1450, dump_queue = dump_queue)
-        packet_reader = PacketReader(super().receive)
-        self.stream_parser = StreamParser(packet_reader)
+        self.stream_parser = StreamParser()
+        self.codec_pool = codec_pool
 
     def receive(self):
-        return None
+        # Everything that has arrived is handed to the parser at once, so that
+        # all requests that are complete end up in a single LoginProtocolMessage
+        fields_bytes = self.stream_parser.complete_fields_bytes()
+        while not fields_bytes:
+            for message in self.receive_all():
+                self.stream_parser.feed(message)
+            fields_bytes = self.stream_parser.complete_fields_bytes()
+        return fields_bytes
 
     def decode(self, msg_bytes):
-        msg = self.stream_parser.parse()
-        return LoginProtocolMessage(msg)
+        trace = latencytracing.start_trace()
+        if self.codec_pool and len(msg_bytes) >= self.codec_pool.min_size:
+            message = LoginProtocolMessage(self.codec_pool.decode(msg_bytes), trace)
+        else:
+            # Handlers typically only look at a few of the fields in a request,
+            # so the rest is only decoded if it is accessed
+            message = LoginProtocolMessage(decode_fields(msg_bytes, lazy=True), trace)
+        if trace:
+            trace.idents = [request.ident for request in message.requests]
+            trace.end_stage('decode')
+        return message
 
 
 class LoginProtocolWriter(TcpMessageConnectionWriter):
@@ -103,12 +167,18 @@ class LoginProtocolWriter(TcpMessageConnectionWriter):
         super().__init__(sock, max_message_size = 1450, dump_queue = dump_queue)
 
     def encode(self, message):
-        stream = io.BytesIO()
-
-        if isinstance(message, list):
-            for el in message:
-                el.write(stream)
+        if isinstance(message, (bytes, bytearray)):
+            # Already encoded, e.g. rendered from a MessageTemplate
+            return message
+        elif isinstance(message, list):
+            return encode_enumfields(message)
         else:
-            message.write(stream)
+            return encode_enumfields([message])
 
-        return stream.getvalue()
+    def message_size(self, message):
+        if isinstance(message, (bytes, bytearray)):
+            return len(message)
+        elif isinstance(message, list):
+            return sum(field.size() for field in message)
+        else:
+            return message.size()
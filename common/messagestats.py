@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+
+from common.metrics import Histogram
+
+handler_seconds = Histogram('gaserver_handler_seconds', 'Time spent by the main loop handling messages and other work.',
+                            ['name'])
+
+
+class MessageTypeStats:
+    __slots__ = ('count', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def __repr__(self):
+        return 'MessageTypeStats(count=%d, total_time=%f, max_time=%f)' % (self.count, self.total_time, self.max_time)
+
+
+class MessageStats:
+    """
+    Counts the messages handled by a server's main loop and the time spent
+    handling them. Messages are recorded under the name of their type and
+    other work done by the loop under a name of its own.
+    """
+    def __init__(self):
+        self.per_type = {}
+        self.batch_count = 0
+        self.max_batch_size = 0
+
+    def record(self, name, start_time):
+        duration = time.perf_counter() - start_time
+        stats = self.per_type.get(name)
+        if stats is None:
+            stats = self.per_type[name] = MessageTypeStats()
+        stats.count += 1
+        stats.total_time += duration
+        if duration > stats.max_time:
+            stats.max_time = duration
+        handler_seconds.observe(duration, (name,))
+
+    def record_batch(self, batch_size):
+        self.batch_count += 1
+        if batch_size > self.max_batch_size:
+            self.max_batch_size = batch_size
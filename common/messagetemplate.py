@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+import io
+
+from common.datatypes import encode_enumfields
+
+
+class TemplateSlot:
+    """
+    Placeholder for an enumfield in a MessageTemplate whose value is only
+    known when the template is rendered.
+    """
+    def __init__(self, name, field):
+        self.name = name
+        self.field = field
+
+    def write(self, stream):
+        stream.write_slot(self)
+
+
+class _TemplateStream:
+    """
+    Stream that the template message is written to, which splits the encoded
+    message into parts at the positions of the slots.
+    """
+    def __init__(self):
+        self.parts = []
+        self.slots = {}
+        self.current = io.BytesIO()
+
+    def write(self, data):
+        self.current.write(data)
+
+    def write_slot(self, slot):
+        if slot.name in self.slots:
+            raise ValueError('Slot %s occurs more than once in the template' % slot.name)
+        self.parts.append(self.current.getvalue())
+        self.slots[slot.name] = len(self.parts)
+        self.parts.append(slot.field)
+        self.current = io.BytesIO()
+
+    def close(self):
+        self.parts.append(self.current.getvalue())
+
+
+class MessageTemplate:
+    """
+    A message, or list of messages, that is encoded only once.
+
+    Fields that differ between uses of the message are marked by wrapping them
+    in a TemplateSlot. Rendering the template only encodes those fields and
+    splices them in between the bytes of the parts of the message that
+    never change.
+    """
+    def __init__(self, message):
+        fields = message if isinstance(message, list) else [message]
+        stream = _TemplateStream()
+        for field in fields:
+            field.write(stream)
+        stream.close()
+
+        self.parts = stream.parts
+        self.slots = stream.slots
+
+    def render(self, **slot_values):
+        """ Returns the bytes of the message with the given values filled in for all slots """
+        if slot_values.keys() != self.slots.keys():
+            raise ValueError('Values must be given for exactly these slots: %s' % ', '.join(self.slots))
+
+        parts = list(self.parts)
+        for name, index in self.slots.items():
+            # Encode a new field of the slot's type, so that the template
+            # itself is left untouched
+            parts[index] = encode_enumfields([type(parts[index])().set(slot_values[name])])
+        return b''.join(parts)
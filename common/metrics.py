@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Minimal counters, gauges and histograms that can be rendered in the
+Prometheus text exposition format.
+
+Updating a metric is cheap enough to do on every message. Rendering all of
+them is done by take_snapshot, so that requests for the metrics can be
+answered with the bytes of the last snapshot without any further work.
+"""
+
+import bisect
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(label_value):
+    return str(label_value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(label_names, label_values, extra=''):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    metric_type = None
+
+    def __init__(self, name, description, label_names=(), registry=None):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        # Metrics without labels are rendered even before they are first updated
+        self.values = {} if self.label_names else {(): self.initial_value()}
+        (registry if registry is not None else default_registry).register(self)
+
+    def initial_value(self):
+        return 0
+
+    def render(self, lines):
+        lines.append('# HELP %s %s' % (self.name, self.description))
+        lines.append('# TYPE %s %s' % (self.name, self.metric_type))
+        for label_values, value in sorted(self.values.items()):
+            self.render_value(lines, label_values, value)
+
+    def render_value(self, lines, label_values, value):
+        lines.append('%s%s %s' % (self.name, _format_labels(self.label_names, label_values), _format_value(value)))
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+    def inc(self, amount=1, labels=()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """ Histogram whose per-label value is a list of bucket counts followed by the sum of all observations """
+    metric_type = 'histogram'
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, description, label_names, registry)
+
+    def initial_value(self):
+        # One count per bucket, one for +Inf and the sum
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, labels=()):
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = self.initial_value()
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render_value(self, lines, label_values, counts):
+        cumulative_count = 0
+        for upper_bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative_count += count
+            labels = _format_labels(self.label_names, label_values, 'le="%s"' % upper_bound)
+            lines.append('%s_bucket%s %d' % (self.name, labels, cumulative_count))
+        labels = _format_labels(self.label_names, label_values)
+        lines.append('%s_sum%s %s' % (self.name, labels, _format_value(counts[-1])))
+        lines.append('%s_count%s %d' % (self.name, labels, cumulative_count))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.snapshot = b''
+
+    def register(self, metric):
+        if any(m.name == metric.name for m in self.metrics):
+            raise ValueError('A metric named %s is already registered' % metric.name)
+        self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            metric.render(lines)
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def take_snapshot(self):
+        self.snapshot = self.render()
+
+
+default_registry = Registry()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import collections
+
+import gevent.event
+
+from common.metrics import Counter
+
+DISCONNECT = 'disconnect'
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+overflow_policies = (DISCONNECT, DROP_OLDEST, COALESCE)
+
+overflow_actions = Counter('gaserver_outgoing_overflow_actions_total',
+                           'Actions taken to keep the messages waiting to be sent to a peer within limits.',
+                           ['connection', 'action'])
+
+
+class OutgoingLimits:
+    """
+    Limits on the messages waiting to be sent to a single peer and what to do
+    about messages that would exceed them:
+
+    - DISCONNECT: disconnect the peer.
+    - DROP_OLDEST: drop the oldest messages that were sent as droppable until
+      the new message fits, and disconnect the peer if that is not enough.
+    - COALESCE: replace a waiting message with a newer one sent with the same
+      replace_key, which is done whenever that happens instead of only when
+      the limits are reached, and disconnect the peer if the limits are
+      still exceeded.
+    """
+    def __init__(self, max_messages=None, max_bytes=None, policy=DISCONNECT):
+        if policy not in overflow_policies:
+            raise ValueError('Overflow policy must be one of %s' % ', '.join(overflow_policies))
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+
+
+class _Entry:
+    __slots__ = ('message', 'size', 'droppable', 'replace_key', 'removed')
+
+    def __init__(self, message, size, droppable, replace_key):
+        self.message = message
+        self.size = size
+        self.droppable = droppable
+        self.replace_key = replace_key
+        self.removed = False
+
+
+class OutgoingQueue:
+    """
+    Queue of the messages waiting to be written to a peer's connection, for a
+    single consumer.
+
+    Messages that are dropped or replaced are only marked as removed and
+    skipped when they reach the front, so that removing them does not depend
+    on the length of the queue. The queue is compacted when more than half of
+    it consists of such messages. Removed entries no longer hold on to their
+    message.
+
+    With the DROP_OLDEST policy, the droppable messages are also kept in
+    order of age. Entries that were sent or removed are taken off the front
+    of that list as the queue is consumed.
+    """
+    def __init__(self, name, limits=None, message_size=None):
+        self.name = name
+        self.limits = limits if limits is not None else OutgoingLimits()
+        self.message_size = message_size if message_size is not None else (lambda message: 0)
+        self.entries = collections.deque()
+        self.droppable_entries = collections.deque()
+        self.replaceable_entries = {}
+        self.message_count = 0
+        self.byte_count = 0
+        self.not_empty = gevent.event.Event()
+
+    def qsize(self):
+        return self.message_count
+
+    def empty(self):
+        return self.message_count == 0
+
+    def put(self, message, droppable=False, replace_key=None):
+        """ Queues message and returns True, or returns False if it does not fit within the limits """
+        limits = self.limits
+        if replace_key is not None and limits.policy == COALESCE:
+            replaced_entry = self.replaceable_entries.get(replace_key)
+            if replaced_entry is not None:
+                self._remove(replaced_entry)
+                overflow_actions.inc(labels=(self.name, COALESCE))
+
+        entry = _Entry(message, self.message_size(message), droppable, replace_key)
+        self._append(entry)
+        if droppable and limits.policy == DROP_OLDEST:
+            self.droppable_entries.append(entry)
+        if replace_key is not None:
+            self.replaceable_entries[replace_key] = entry
+
+        if self._over_limits() and limits.policy == DROP_OLDEST:
+            while self._over_limits() and self.droppable_entries:
+                dropped_entry = self.droppable_entries.popleft()
+                if not dropped_entry.removed:
+                    self._remove(dropped_entry)
+                    overflow_actions.inc(labels=(self.name, DROP_OLDEST))
+
+        if self._over_limits():
+            overflow_actions.inc(labels=(self.name, DISCONNECT))
+            return False
+
+        self._compact_if_needed()
+        return True
+
+    def put_unlimited(self, message):
+        """ Queues a message that the limits do not apply to, such as a PeerDisconnectedMessage """
+        self._append(_Entry(message, 0, False, None))
+
+    def get_nowait(self):
+        entries = self.entries
+        while entries:
+            entry = entries.popleft()
+            if not entry.removed:
+                message = entry.message
+                self._remove(entry)
+                self._pop_removed_droppable_entries()
+                return message
+        raise IndexError('get_nowait called on an empty OutgoingQueue')
+
+    def get(self):
+        while not self.message_count:
+            self.not_empty.clear()
+            self.not_empty.wait()
+        return self.get_nowait()
+
+    def get_all(self):
+        """ Returns all queued messages without waiting """
+        messages = [entry.message for entry in self.entries if not entry.removed]
+        self.clear()
+        return messages
+
+    def clear(self):
+        self.entries.clear()
+        self.droppable_entries.clear()
+        self.replaceable_entries.clear()
+        self.message_count = 0
+        self.byte_count = 0
+
+    def _over_limits(self):
+        limits = self.limits
+        return ((limits.max_messages is not None and self.message_count > limits.max_messages) or
+                (limits.max_bytes is not None and self.byte_count > limits.max_bytes))
+
+    def _append(self, entry):
+        self.entries.append(entry)
+        self.message_count += 1
+        self.byte_count += entry.size
+        self.not_empty.set()
+
+    def _remove(self, entry):
+        entry.removed = True
+        entry.message = None
+        self._forget(entry)
+
+    def _pop_removed_droppable_entries(self):
+        droppable_entries = self.droppable_entries
+        while droppable_entries and droppable_entries[0].removed:
+            droppable_entries.popleft()
+
+    def _forget(self, entry):
+        self.message_count -= 1
+        self.byte_count -= entry.size
+        if entry.replace_key is not None and self.replaceable_entries.get(entry.replace_key) is entry:
+            del self.replaceable_entries[entry.replace_key]
+
+    def _compact_if_needed(self):
+        if len(self.entries) > 2 * self.message_count + 16:
+            self.entries = collections.deque(entry for entry in self.entries if not entry.removed)
+        # The droppable entries are at most all of the queued messages
+        if len(self.droppable_entries) > 2 * self.message_count + 16:
+            self.droppable_entries = collections.deque(entry for entry in self.droppable_entries
+                                                       if not entry.removed)
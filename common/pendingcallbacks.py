@@ -18,41 +18,94 @@
 # along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from common.geventwrapper import gevent_spawn_later
+import heapq
+import itertools
+import time
+
+import gevent.event
+
+from common.geventwrapper import gevent_spawn
 from common import utils
 
 
 class ExecuteCallbackMessage():
-    def __init__(self, callback_id):
+    def __init__(self, callbacks):
+        self.callbacks = callbacks
+
+
+class PendingCallback:
+    __slots__ = ('callback_id', 'receiver_id', 'callback_func')
+
+    def __init__(self, callback_id, receiver_id, callback_func):
         self.callback_id = callback_id
+        self.receiver_id = receiver_id
+        self.callback_func = callback_func
 
 
 class PendingCallbacks:
+    """
+    Schedules callbacks to be executed by the server after a delay.
+
+    All callbacks are kept in a single heap ordered by due time. One scheduler
+    greenlet sleeps until the earliest one is due and then posts everything
+    that has become due in one ExecuteCallbackMessage to the server queue.
+    Callbacks are also indexed by receiver, so that remove_receiver only
+    touches the callbacks of that receiver. Cancelled callbacks stay in the
+    heap until they are due, but are skipped instead of being posted.
+    """
     def __init__(self, server_queue):
         self.server_queue = server_queue
-        self.callbacks = {}
+        self.callbacks_by_receiver = {}
+        self.callback_ids = utils.IdAllocator(0)
+        self.schedule = []
+        self.sequence = itertools.count()
+        self.wakeup = gevent.event.Event()
+        self.scheduler = None
 
     def add(self, receiver, seconds_from_now, callback_func):
-        callback_id = utils.first_unused_number_above(self.callbacks.keys(), 0)
+        callback = PendingCallback(self.callback_ids.allocate(), id(receiver), callback_func)
+        self.callbacks_by_receiver.setdefault(callback.receiver_id, {})[callback.callback_id] = callback
+
+        heapq.heappush(self.schedule, (time.monotonic() + seconds_from_now, next(self.sequence), callback))
+        if self.schedule[0][2] is callback:
+            self.wakeup.set()
 
-        self.callbacks[callback_id] = {'receiver_id': id(receiver),
-                                       'callback_func': callback_func }
-        gevent_spawn_later('pending callback for %s' % receiver, seconds_from_now, self._post_callback, callback_id)
+        if self.scheduler is None:
+            self.scheduler = gevent_spawn('pending callback scheduler', self._run_scheduler)
 
     def remove_receiver(self, receiver):
-        for callback_id, callback in self.callbacks.items():
-            if callback['receiver_id'] == id(receiver):
-                # Only disable callbacks here, removal is done when the callback is fired
-                callback['callback_func'] = None
+        for callback in self.callbacks_by_receiver.pop(id(receiver), {}).values():
+            # Callbacks that are still in the schedule or already posted to the
+            # server queue are skipped because they no longer have a function
+            callback.callback_func = None
+            self.callback_ids.release(callback.callback_id)
+
+    def _run_scheduler(self):
+        while True:
+            self.wakeup.clear()
+            now = time.monotonic()
+
+            due_callbacks = []
+            while self.schedule and self.schedule[0][0] <= now:
+                callback = heapq.heappop(self.schedule)[2]
+                if callback.callback_func is not None:
+                    due_callbacks.append(callback)
+            if due_callbacks:
+                self.server_queue.put(ExecuteCallbackMessage(due_callbacks))
 
-    def _post_callback(self, callback_id):
-        self.server_queue.put(ExecuteCallbackMessage(callback_id))
+            self.wakeup.wait(self.schedule[0][0] - now if self.schedule else None)
 
-    def execute(self, callback_id):
-        assert callback_id in self.callbacks, "Callback not found. A callback should only be removed by " \
-                                              "its trigger to avoid problems with reused callback IDs."
+    def execute(self, callbacks):
+        for callback in callbacks:
+            callback_func = callback.callback_func
+            if callback_func is None:
+                continue
 
-        if self.callbacks[callback_id]['callback_func'] is not None:
-            self.callbacks[callback_id]['callback_func']()
-        del self.callbacks[callback_id]
+            receiver_callbacks = self.callbacks_by_receiver[callback.receiver_id]
+            del receiver_callbacks[callback.callback_id]
+            if not receiver_callbacks:
+                del self.callbacks_by_receiver[callback.receiver_id]
+            callback.callback_func = None
+            self.callback_ids.release(callback.callback_id)
 
+            callback_func()
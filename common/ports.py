@@ -25,6 +25,7 @@ class Ports:
         'client2login': 9000,  # TCP
         'launcher2login': 9001,  # TCP
         'restapi': 9080,  # TCP
+        'logincoordinator': 9081,  # TCP, only on localhost
         'authchannel': 9800 # TCP
     }
 
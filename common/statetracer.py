@@ -41,6 +41,14 @@ class StateTracer:
         self.enabled = False
         self.members_to_trace = [str(name) for name in members_to_trace]
         self.refonly_members = set(str(name) for name in members_to_trace if isinstance(name, RefOnly))
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """ Call listener(obj, member_name, old_value, new_value) whenever a traced member changes """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
 
     def add_to_trace(self, member_name):
         #print('add_to_trace: %s' % member_name)
@@ -56,6 +64,8 @@ class StateTracer:
     def member_changed(self, member_name, old_value, new_value):
         #print('member_changed: %s from %s to %s (trace is %s, members to trace: %s)' % (member_name, old_value, new_value, self.enabled, self.members_to_trace))
         assert member_name in self.members_to_trace
+        for listener in self.listeners:
+            listener(self.obj, member_name, old_value, new_value)
         if self.enabled:
             if member_name not in self.refonly_members:
                 if hasattr(old_value, '_state_tracer'):
@@ -191,6 +201,95 @@ class TracingDict(dict):
             self._state_tracer.member_removed(key, self[key])
         return super().pop(key, *args)
 
+class IndexedTracingDict(TracingDict):
+    """
+    TracingDict of state-traced objects that also keeps secondary indexes on
+    some of their attributes, so that values can be looked up without going
+    over all of them.
+
+    The indexes follow changes to those attributes through the listeners of
+    the values' state tracers. Each index maps a key to a dict that is used as
+    an insertion-ordered set of the values with that key.
+    """
+
+    # Indexed attributes and the function that turns a value into an index key
+    indexed_attributes = {}
+
+    def __init__(self, *args, **kwargs):
+        self.indexes = {name: {} for name in self.indexed_attributes}
+        super().__init__(*args, **kwargs)
+        for value in self.values():
+            self._add_to_indexes(value)
+
+    def _index_key(self, attribute_name, attribute_value):
+        key_func = self.indexed_attributes[attribute_name]
+        return key_func(attribute_value) if key_func else attribute_value
+
+    def _add_to_index(self, value, attribute_name, attribute_value):
+        key = self._index_key(attribute_name, attribute_value)
+        self.indexes[attribute_name].setdefault(key, {})[value] = None
+
+    def _remove_from_index(self, value, attribute_name, attribute_value):
+        index = self.indexes[attribute_name]
+        key = self._index_key(attribute_name, attribute_value)
+        del index[key][value]
+        if not index[key]:
+            del index[key]
+
+    def _add_to_indexes(self, value):
+        assert hasattr(value, '_state_tracer') and \
+               all(name in value._state_tracer.members_to_trace for name in self.indexed_attributes), \
+               'Values of %s must be state-traced on all of its indexed attributes (%s)' % \
+               (type(self).__name__, ', '.join(self.indexed_attributes))
+        for attribute_name in self.indexed_attributes:
+            self._add_to_index(value, attribute_name, getattr(value, attribute_name))
+        value._state_tracer.add_listener(self._value_changed)
+
+    def _remove_from_indexes(self, value):
+        value._state_tracer.remove_listener(self._value_changed)
+        for attribute_name in self.indexed_attributes:
+            self._remove_from_index(value, attribute_name, getattr(value, attribute_name))
+
+    def _value_changed(self, value, member_name, old_value, new_value):
+        if member_name in self.indexed_attributes:
+            self._remove_from_index(value, member_name, old_value)
+            self._add_to_index(value, member_name, new_value)
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self._remove_from_indexes(self[key])
+        super().__setitem__(key, value)
+        self._add_to_indexes(value)
+
+    def __delitem__(self, key):
+        self._remove_from_indexes(self[key])
+        super().__delitem__(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self._remove_from_indexes(self[key])
+        return super().pop(key, *args)
+
+    def find_by(self, **kwargs):
+        """
+        Returns a list of all values whose attributes have the given values
+
+        The values are listed in the order in which they were added to the
+        index of the first indexed attribute given, or otherwise in the order
+        of the dictionary itself.
+        """
+        candidates = self.values()
+        for attribute_name, attribute_value in kwargs.items():
+            if attribute_name in self.indexed_attributes:
+                candidates = self.indexes[attribute_name].get(self._index_key(attribute_name, attribute_value), {})
+                break
+
+        # Index keys may be normalized (e.g. case-folded), so all values are compared exactly here
+        return [value for value in candidates
+                if all(getattr(value, attribute_name) == attribute_value
+                       for attribute_name, attribute_value in kwargs.items())]
+
+
 def setup_properties(cls, members):
 
         for name in members:
@@ -18,9 +18,27 @@
 # along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import io
+import collections
+import os
+import socket as _socket
 import struct
 
+from common.metrics import Counter
+
+
+_packet_size_struct = struct.Struct('<H')
+
+try:
+    _max_buffers_per_call = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _max_buffers_per_call = 1024
+
+# Flag that makes a single send return instead of waiting for room in the send buffer
+_dontwait_flag = getattr(_socket, 'MSG_DONTWAIT', None)
+
+received_bytes = Counter('gaserver_tcp_received_bytes_total', 'Bytes received on TCP message connections.')
+sent_bytes = Counter('gaserver_tcp_sent_bytes_total', 'Bytes sent on TCP message connections.')
+
 
 class TcpMessageReader:
     def __init__(self, socket, max_message_size = 0xFFFF, dump_queue = None):
@@ -37,6 +55,7 @@ class TcpMessageReader:
             chunk = self.socket.recv(remaining_size)
             if not chunk:
                 raise ConnectionResetError()
+            received_bytes.inc(len(chunk))
             remaining_size -= len(chunk)
             msg += chunk
         return msg
@@ -58,28 +77,197 @@ class TcpMessageReader:
         return packet_body_bytes
 
 
+class BufferedTcpMessageReader:
+    """
+    Variant of TcpMessageReader that fills a reusable receive buffer with
+    large recv_into calls instead of issuing two recv calls per message.
+    All complete messages that arrive in a single read are split off at once,
+    so a burst of messages costs a single system call.
+
+    By default the buffer holds eight messages of the maximum size, up to
+    256 KiB, so that connections with small messages also have small buffers.
+    """
+    def __init__(self, socket, max_message_size = 0xFFFF, dump_queue = None, buffer_size = None):
+        self.socket = socket
+        self.max_message_size = max_message_size
+        self.dump_queue = dump_queue
+        if self.max_message_size > 0xFFFF:
+            raise ValueError('max_message_size is not allowed to be greater than 0xFFFF')
+
+        if buffer_size is None:
+            buffer_size = min(8 * (self.max_message_size + _packet_size_struct.size), 0x40000)
+        # The buffer must always be able to hold at least one complete message
+        self.buffer = bytearray(max(buffer_size, self.max_message_size + _packet_size_struct.size))
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.messages = collections.deque()
+
+    def _fill(self):
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif len(self.buffer) - self.end < self.max_message_size + _packet_size_struct.size:
+            # Move the incomplete message at the end to the start of the buffer
+            # to make room for the rest of it
+            remaining = self.end - self.start
+            self.view[:remaining] = self.view[self.start:self.end]
+            self.start = 0
+            self.end = remaining
+
+        nbytes = self.socket.recv_into(self.view[self.end:])
+        if nbytes == 0:
+            raise ConnectionResetError()
+        received_bytes.inc(nbytes)
+        self.end += nbytes
+
+    def _split_messages(self):
+        buffer = self.buffer
+        view = self.view
+        messages = self.messages
+        max_message_size = self.max_message_size
+        start = self.start
+        end = self.end
+        header_size = _packet_size_struct.size
+        unpack_from = _packet_size_struct.unpack_from
+
+        while end - start >= header_size:
+            packet_size = unpack_from(buffer, start)[0]
+            if packet_size == 0:
+                packet_size = max_message_size
+            elif packet_size > max_message_size:
+                raise RuntimeError('Received a packet size that is larger than the TcpMessageReader was created for')
+
+            packet_end = start + header_size + packet_size
+            if packet_end > end:
+                break
+
+            if self.dump_queue:
+                self.dump_queue.put(('tcpreader', bytes(view[start:packet_end])))
+            messages.append(bytes(view[start + header_size:packet_end]))
+            start = packet_end
+
+        self.start = start
+
+    def receive(self):
+        messages = self.messages
+        while not messages:
+            self._fill()
+            self._split_messages()
+        return messages.popleft()
+
+    def receive_all(self):
+        """ Return all messages that are available, waiting only if there are none """
+        while not self.messages:
+            self._fill()
+            self._split_messages()
+        messages = list(self.messages)
+        self.messages.clear()
+        return messages
+
+
 class TcpMessageWriter:
+    """
+    Writes messages to a socket, each preceded by its size.
+
+    Besides the blocking send and send_many, messages can be sent with
+    send_many_nowait, which never waits for room in the socket's send buffer.
+    What does not fit is kept as a backlog: messages that have been partly
+    sent and whole messages that are still pending. It is sent by flush.
+    """
     def __init__(self, socket, max_message_size = 0xFFFF, dump_queue = None):
         self.socket = socket
         self.max_message_size = max_message_size
         self.dump_queue = dump_queue
+        self.in_flight = []
+        self.pending = collections.deque()
         if self.max_message_size > 0xFFFF:
             raise ValueError('max_message_size is not allowed to be greater than 0xFFFF')
 
-    def send(self, data):
+    def _add_frames(self, data, buffers):
         size = len(data)
         if size == 0:
             raise ValueError('TcpMessageWriter: Sending empty messages is not allowed')
-        output_buffer = io.BytesIO()
-        while size > 0:
-            output_buffer.write(struct.pack('<H', size if size < self.max_message_size else 0))
-            output_buffer.write(data[:self.max_message_size])
-            data = data[self.max_message_size:]
-            size = len(data)
+
+        first_buffer = len(buffers)
+        view = memoryview(data)
+        for offset in range(0, size, self.max_message_size):
+            chunk = view[offset:offset + self.max_message_size]
+            buffers.append(_packet_size_struct.pack(len(chunk) if len(chunk) < self.max_message_size else 0))
+            buffers.append(chunk)
 
         if self.dump_queue:
-            self.dump_queue.put(('tcpwriter', output_buffer.getvalue()))
-        self.socket.sendall(output_buffer.getvalue())
+            self.dump_queue.put(('tcpwriter', b''.join(buffers[first_buffer:])))
+
+    def _send_buffers(self, buffers, flags=0):
+        """
+        Sends all buffers, removing them from the list as they are sent. With
+        the flag MSG_DONTWAIT, BlockingIOError is raised when the send buffer
+        is full and the list holds what is left.
+        """
+        if not hasattr(self.socket, 'sendmsg'):
+            # Scatter-gather output is not available on all platforms
+            data = b''.join(buffers)
+            self.socket.sendall(data)
+            sent_bytes.inc(len(data))
+            buffers.clear()
+            return
+
+        first = 0
+        try:
+            while first < len(buffers):
+                chunk = buffers[first:first + _max_buffers_per_call]
+                sent = self.socket.sendmsg(chunk, (), flags) if flags else self.socket.sendmsg(chunk)
+                sent_bytes.inc(sent)
+                while first < len(buffers) and sent >= len(buffers[first]):
+                    sent -= len(buffers[first])
+                    first += 1
+                if sent:
+                    buffers[first] = memoryview(buffers[first])[sent:]
+        finally:
+            del buffers[:first]
+
+    def send(self, data):
+        self.send_many([data])
+
+    def send_many(self, data_list):
+        """ Send several messages with as few system calls as possible """
+        buffers = []
+        for data in data_list:
+            self._add_frames(data, buffers)
+        self._send_buffers(buffers)
+
+    @property
+    def backlog(self):
+        return bool(self.in_flight or self.pending)
+
+    def backlog_size(self):
+        """ Number of messages in the backlog, counting those that have been partly sent as one """
+        return len(self.pending) + bool(self.in_flight)
+
+    def send_many_nowait(self, data_list):
+        """
+        Sends several messages as far as the socket's send buffer allows
+        without waiting. Returns False if anything is left to be sent by flush.
+        """
+        if self.backlog or not hasattr(self.socket, 'sendmsg') or _dontwait_flag is None:
+            self.pending.extend(data_list)
+            return False
+
+        for data in data_list:
+            self._add_frames(data, self.in_flight)
+        try:
+            self._send_buffers(self.in_flight, _dontwait_flag)
+        except BlockingIOError:
+            return False
+        return True
+
+    def flush(self):
+        """ Sends the backlog, waiting for room in the send buffer, until there is none left """
+        while self.backlog:
+            if not self.in_flight:
+                while self.pending:
+                    self._add_frames(self.pending.popleft(), self.in_flight)
+            self._send_buffers(self.in_flight)
 
     def close(self):
         self.socket.close()
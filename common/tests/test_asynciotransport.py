@@ -0,0 +1,36 @@
+import unittest
+
+import gevent
+
+from common.asynciotransport import AsyncioTransport
+from common.tcpmessage import BufferedTcpMessageReader, TcpMessageWriter
+
+
+def echo(sock, address):
+    reader = BufferedTcpMessageReader(sock, max_message_size = 1450)
+    writer = TcpMessageWriter(sock, max_message_size = 1450)
+    try:
+        while True:
+            writer.send_many(reader.receive_all())
+    except ConnectionResetError:
+        sock.close()
+
+
+class TestAsyncioTransport(unittest.TestCase):
+
+    def test_messages_make_a_round_trip(self):
+        transport = AsyncioTransport()
+        server = gevent.spawn(transport.serve, '127.0.0.1', 19200, echo)
+        gevent.sleep(0.1)
+        try:
+            with transport.connect('127.0.0.1', 19200) as sock:
+                reader = BufferedTcpMessageReader(sock, max_message_size = 1450)
+                writer = TcpMessageWriter(sock, max_message_size = 1450)
+                messages = [bytes([i]) * (i * 20 + 1) for i in range(60)]
+                writer.send_many(messages)
+                received = []
+                while len(received) < len(messages):
+                    received.extend(reader.receive_all())
+                self.assertEqual(received, messages)
+        finally:
+            server.kill()
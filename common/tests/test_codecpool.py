@@ -0,0 +1,40 @@
+import unittest
+
+import gevent
+
+from common.codecpool import CodecPool
+from common.datatypes import a003b, m0071, m052d, encode_enumfields
+
+
+class TestCodecPool(unittest.TestCase):
+
+    def setUp(self):
+        self.codec_pool = CodecPool(2)
+
+    def tearDown(self):
+        self.codec_pool.close()
+
+    def test_results_are_returned_to_the_greenlet_that_asked_for_them(self):
+        def login(name):
+            request = a003b().set([m052d().set(name), m0071().set(b'p' * 90)])
+            return self.codec_pool.decode(encode_enumfields([request]))[0].findbytype(m052d).value
+
+        names = ['player%d' % i for i in range(20)]
+        greenlets = [gevent.spawn(login, name) for name in names]
+        gevent.joinall(greenlets, raise_error=True)
+        self.assertEqual([greenlet.value for greenlet in greenlets], names)
+
+    def test_errors_are_raised_in_the_caller(self):
+        with self.assertRaises(RuntimeError):
+            self.codec_pool.decode(b'\x01\x02\x03')
+
+    def test_exited_processes_are_replaced(self):
+        request = encode_enumfields([a003b().set([m052d().set('player'), m0071().set(b'p' * 90)])])
+        exited_processes = list(self.codec_pool.processes)
+        for process in exited_processes:
+            process.process.kill()
+            process.reader.join()
+
+        self.assertEqual(self.codec_pool.decode(request)[0].findbytype(m052d).value, 'player')
+        self.assertTrue(all(process not in exited_processes and not process.exited
+                            for process in self.codec_pool.processes))
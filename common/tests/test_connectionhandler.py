@@ -0,0 +1,56 @@
+import unittest
+
+import gevent
+import gevent.queue
+from gevent import socket
+
+from common.connectionhandler import Peer, PeerConnectedMessage, PeerDisconnectedMessage, \
+    TcpMessageConnectionReader, TcpMessageConnectionWriter
+from common.outgoingqueue import OutgoingLimits, OutgoingQueue
+
+
+class BytesReader(TcpMessageConnectionReader):
+    def decode(self, msg_bytes):
+        return msg_bytes
+
+
+class BytesWriter(TcpMessageConnectionWriter):
+    def encode(self, msg):
+        return msg
+
+
+class TestPeer(unittest.TestCase):
+
+    def test_overflow_closes_a_connection_that_is_stuck_sending(self):
+        sock, other_sock = socket.socketpair()
+        incoming_queue = gevent.queue.Queue()
+        outgoing_queue = OutgoingQueue('test', OutgoingLimits(max_messages=10), len)
+
+        peer = Peer()
+        peer.sock = sock
+        peer.outgoing_queue = outgoing_queue
+        reader = BytesReader(sock)
+        reader.incoming_queue = incoming_queue
+        reader.peer = peer
+        writer = BytesWriter(sock)
+        writer.outgoing_queue = outgoing_queue
+        tasks = [gevent.spawn(reader.run), gevent.spawn(writer.run)]
+
+        try:
+            # The other side never reads, so the writer gets stuck waiting
+            # for room in the send buffer and the outgoing queue overflows
+            while not peer.disconnecting:
+                peer.send(b'x' * 0xFFF0)
+                gevent.sleep(0)
+
+            gevent.joinall(tasks, timeout=1)
+            self.assertTrue(all(task.dead for task in tasks))
+            self.assertIsInstance(incoming_queue.get_nowait(), PeerConnectedMessage)
+            self.assertIsInstance(incoming_queue.get_nowait(), PeerDisconnectedMessage)
+        finally:
+            gevent.killall(tasks)
+            other_sock.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
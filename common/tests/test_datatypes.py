@@ -0,0 +1,92 @@
+import io
+import struct
+import unittest
+
+from common.datatypes import *
+
+
+def write(fields):
+    stream = io.BytesIO()
+    for field in fields:
+        field.write(stream)
+    return stream.getvalue()
+
+
+class TestEncodeEnumfields(unittest.TestCase):
+
+    def test_same_bytes_as_write(self):
+        params = [([m0376()], 'single fixed size field'),
+                  ([m03c5().set('somename'), m0473(), m04d4().set(1), m0375().set(0xf3f8)], 'mixed fields'),
+                  ([m0071().set(b'p' * 90)], 'variable length bytes'),
+                  ([a0188()], 'empty enumblockarray'),
+                  ([a003e().set([m03c5().set('somename'),
+                                 m010c().set([[m04da().set(1), m0371().set(0xa26f)],
+                                              [m04da().set(2)],
+                                              []])])],
+                   'nested arrays')]
+
+        for fields, comment in params:
+            with self.subTest(comment=comment):
+                self.assertEqual(bytes(encode_enumfields(fields)), write(fields))
+                self.assertEqual(len(encode_enumfields(fields)), sum(field.size() for field in fields))
+
+    def test_pre_encoded_inner_arrays(self):
+        inner_array = [m04da().set(1), m0371().set(0xa26f)]
+        pre_encoded_inner_array = struct.pack('<H', len(inner_array)) + encode_enumfields(inner_array)
+        fields = [m010c().set([inner_array, [m04da().set(2)]])]
+        pre_encoded_fields = [m010c().set([pre_encoded_inner_array, [m04da().set(2)]])]
+
+        self.assertEqual(encode_enumfields(pre_encoded_fields), encode_enumfields(fields))
+        self.assertEqual(write(pre_encoded_fields), write(fields))
+        self.assertEqual(pre_encoded_fields[0].size(), fields[0].size())
+
+
+class TestEnumblockarrayLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.fields = [m03c5().set('first'), m0376().set(1), m03c5().set('second'), m010c()]
+        self.data = bytes(encode_enumfields([a0034().set(self.fields)]))
+
+    def decoded(self):
+        return [('set', a0034().set(list(self.fields))),
+                ('read', a0034().read(ByteReader(self.data))),
+                ('read_lazily', a0034().read_lazily(ByteReader(self.data)))]
+
+    def test_findbytype(self):
+        for how, arr in self.decoded():
+            with self.subTest(how=how):
+                self.assertEqual(arr.findbytype(m03c5).value, 'first')
+                self.assertEqual(arr.findbytype(m0376).value, 1)
+                self.assertIsNone(arr.findbytype(m0473))
+                self.assertIs(findbytype(arr, m010c), arr.findbytype(m010c))
+
+    def test_findallbytype(self):
+        for how, arr in self.decoded():
+            with self.subTest(how=how):
+                self.assertEqual([field.value for field in arr.findallbytype(m03c5)], ['first', 'second'])
+                self.assertEqual(arr.findallbytype(m0473), [])
+
+    def test_extract(self):
+        for how, arr in self.decoded():
+            with self.subTest(how=how):
+                display_name, count, missing = arr.extract(m03c5, m0376, m0473)
+                self.assertEqual((display_name.value, count.value, missing), ('first', 1, None))
+
+    def test_index_follows_set(self):
+        arr = a0034().read(ByteReader(self.data))
+        arr.set([m0473()])
+        self.assertIsNone(arr.findbytype(m03c5))
+        self.assertIsNotNone(arr.findbytype(m0473))
+
+    def test_index_follows_content_modified_in_place(self):
+        for how, arr in self.decoded():
+            with self.subTest(how=how):
+                self.assertEqual(arr.findbytype(m0376).value, 1)
+                arr.content[1] = m0473()
+                arr.content.append(m0376().set(2))
+                self.assertIsNotNone(arr.findbytype(m0473))
+                self.assertEqual(arr.findbytype(m0376).value, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
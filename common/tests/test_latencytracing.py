@@ -0,0 +1,34 @@
+import unittest
+
+from common import latencytracing
+
+
+class TestLatencyTracing(unittest.TestCase):
+
+    def tearDown(self):
+        latencytracing.set_sample_rate(0.0)
+
+    def test_sample_rate(self):
+        latencytracing.set_sample_rate(0.0)
+        self.assertIsNone(latencytracing.start_trace())
+        latencytracing.set_sample_rate(1.0)
+        self.assertIsNotNone(latencytracing.start_trace())
+        with self.assertRaises(ValueError):
+            latencytracing.set_sample_rate(1.5)
+
+    def test_stages_are_recorded_per_ident(self):
+        latencytracing.set_sample_rate(1.0)
+        trace = latencytracing.start_trace()
+        trace.idents = [0x0ff1, 0x0ff2]
+        trace.end_stage('decode')
+        trace.end_stage('handler', [0x0ff2])
+
+        values = latencytracing.stage_seconds.values
+        self.assertIn(('a0ff1', 'decode'), values)
+        self.assertIn(('a0ff2', 'decode'), values)
+        self.assertNotIn(('a0ff1', 'handler'), values)
+        self.assertIn(('a0ff2', 'handler'), values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import io
+import unittest
+
+from common.datatypes import *
+from common.loginprotocol import StreamParser, decode_fields
+
+
+def encode(fields):
+    stream = io.BytesIO()
+    for field in fields:
+        field.write(stream)
+    return stream.getvalue()
+
+
+def example_fields():
+    return [
+        a003b().set([
+            m052d().set('someplayer'),
+            m0071().set(b'p' * 90),
+        ]),
+        a0034().set([
+            m03c5().set('someplayer'),
+            m010c().set([
+                [m04da().set(1), m0371().set(0xa26f)],
+                [m04da().set(2), m0371().set(0xa20b), m0326().set('Dome City')],
+            ]),
+            m0180(),
+        ]),
+        a0188().set([
+            m0376(),
+        ]),
+        a01e8(),
+    ]
+
+
+class TestStreamParser(unittest.TestCase):
+
+    def test_parse_in_chunks(self):
+        data = encode(example_fields())
+
+        for chunk_size in (1, 2, 3, 7, 64, len(data)):
+            with self.subTest(chunk_size=chunk_size):
+                parser = StreamParser()
+                fields = []
+                for offset in range(0, len(data), chunk_size):
+                    parser.feed(data[offset:offset + chunk_size])
+                    fields.extend(parser.parse())
+                self.assertEqual([type(field) for field in fields], [type(field) for field in example_fields()])
+                self.assertEqual(encode(fields), data)
+
+    def test_next_field_bytes(self):
+        fields = example_fields()
+        data = encode(fields)
+        parser = StreamParser()
+        parser.feed(data[:-1])
+        received = []
+        field_bytes = parser.next_field_bytes()
+        while field_bytes is not None:
+            received.append(field_bytes)
+            field_bytes = parser.next_field_bytes()
+        self.assertEqual(received, [encode([field]) for field in fields[:-1]])
+
+        parser.feed(data[-1:])
+        self.assertEqual(parser.next_field_bytes(), encode(fields[-1:]))
+        self.assertIsNone(parser.next_field_bytes())
+
+    def test_complete_fields_bytes(self):
+        fields = example_fields()
+        data = encode(fields)
+        parser = StreamParser()
+        parser.feed(data[:-1])
+        self.assertEqual(parser.complete_fields_bytes(), encode(fields[:-1]))
+        self.assertEqual(parser.complete_fields_bytes(), b'')
+        parser.feed(data[-1:])
+        self.assertEqual(parser.complete_fields_bytes(), encode(fields[-1:]))
+
+    def test_decode_fields(self):
+        data = encode(example_fields())
+        fields = decode_fields(data)
+        self.assertEqual(fields[0].findbytype(m052d).value, 'someplayer')
+        self.assertEqual(encode(fields), data)
+
+    def test_decode_fields_lazily(self):
+        data = encode(example_fields())
+        fields = decode_fields(data, lazy=True)
+        self.assertEqual(fields[0].findbytype(m052d).value, 'someplayer')
+        self.assertIsNone(fields[0].findbytype(m03c5))
+        self.assertEqual(fields[1].findbytype(m010c).arrays[1][2].value, 'Dome City')
+        self.assertEqual([type(field) for field in fields[1].content], [m03c5, m010c, m0180])
+        self.assertEqual(encode(fields), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
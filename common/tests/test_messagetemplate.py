@@ -0,0 +1,60 @@
+import unittest
+
+from common.datatypes import *
+from common.messagetemplate import MessageTemplate, TemplateSlot
+
+
+def reply(display_name, region):
+    return [
+        a0034().set([
+            m03c5().set(display_name),
+            m010c().set([
+                [m04da().set(region), m0326().set('Dome City')],
+            ]),
+            m0180(),
+        ]),
+        a0188().set([m0376()]),
+    ]
+
+
+class TestMessageTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.template = MessageTemplate([
+            a0034().set([
+                TemplateSlot('display_name', m03c5()),
+                m010c().set([
+                    [TemplateSlot('region', m04da()), m0326().set('Dome City')],
+                ]),
+                m0180(),
+            ]),
+            a0188().set([m0376()]),
+        ])
+
+    def test_render(self):
+        params = [('', 1, 'empty string'),
+                  ('somename', 2, 'short string'),
+                  ('a' * 300, 0xFFFFFFFF, 'long string')]
+
+        for display_name, region, comment in params:
+            with self.subTest(comment=comment):
+                self.assertEqual(self.template.render(display_name=display_name, region=region),
+                                 encode_enumfields(reply(display_name, region)))
+
+    def test_render_without_slots(self):
+        template = MessageTemplate(a0188().set([m0376()]))
+        self.assertEqual(template.render(), encode_enumfields([a0188().set([m0376()])]))
+
+    def test_render_leaves_template_unchanged(self):
+        slot_field = m03c5().set('template')
+        template = MessageTemplate(a0034().set([TemplateSlot('display_name', slot_field)]))
+        template.render(display_name='somename')
+        self.assertEqual(slot_field.value, 'template')
+
+    def test_missing_slot_value(self):
+        with self.assertRaises(ValueError):
+            self.template.render(display_name='somename')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from common.metrics import Counter, Gauge, Histogram, Registry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        counter = Counter('requests_total', 'Requests.', ['ident'], registry=self.registry)
+        gauge = Gauge('queue_depth', 'Queue depth.', registry=self.registry)
+        counter.inc(labels=('003a',))
+        counter.inc(2, labels=('003a',))
+        counter.inc(labels=('0034',))
+        gauge.set(5)
+
+        self.assertEqual(self.registry.render().decode('utf-8'),
+                         '# HELP requests_total Requests.\n'
+                         '# TYPE requests_total counter\n'
+                         'requests_total{ident="0034"} 1\n'
+                         'requests_total{ident="003a"} 3\n'
+                         '# HELP queue_depth Queue depth.\n'
+                         '# TYPE queue_depth gauge\n'
+                         'queue_depth 5\n')
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('latency_seconds', 'Latency.', ['stage'], buckets=(0.1, 1.0), registry=self.registry)
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, labels=('decode',))
+
+        self.assertEqual(self.registry.render().decode('utf-8').splitlines()[2:],
+                         ['latency_seconds_bucket{stage="decode",le="0.1"} 2',
+                          'latency_seconds_bucket{stage="decode",le="1.0"} 3',
+                          'latency_seconds_bucket{stage="decode",le="+Inf"} 4',
+                          'latency_seconds_sum{stage="decode"} 2.65',
+                          'latency_seconds_count{stage="decode"} 4'])
+
+    def test_snapshot_only_changes_when_taken(self):
+        counter = Counter('events_total', 'Events.', registry=self.registry)
+        counter.inc()
+        self.registry.take_snapshot()
+        counter.inc()
+
+        self.assertIn(b'events_total 1\n', self.registry.snapshot)
+        self.registry.take_snapshot()
+        self.assertIn(b'events_total 2\n', self.registry.snapshot)
+
+    def test_label_values_are_escaped(self):
+        gauge = Gauge('players', 'Players.', ['state'], registry=self.registry)
+        gauge.set(1, labels=('a"b\\c',))
+        self.assertIn(b'players{state="a\\"b\\\\c"} 1\n', self.registry.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from common.outgoingqueue import COALESCE, DISCONNECT, DROP_OLDEST, OutgoingLimits, OutgoingQueue, overflow_actions
+
+
+def make_queue(policy, max_messages=None, max_bytes=None):
+    return OutgoingQueue('test_%s' % policy, OutgoingLimits(max_messages, max_bytes, policy), len)
+
+
+class TestOutgoingQueue(unittest.TestCase):
+
+    def test_returns_messages_in_order(self):
+        queue = make_queue(DISCONNECT)
+        for msg in (b'a', b'bb', b'ccc'):
+            self.assertTrue(queue.put(msg))
+        self.assertEqual(queue.byte_count, 6)
+        self.assertEqual([queue.get_nowait() for _ in range(3)], [b'a', b'bb', b'ccc'])
+        self.assertTrue(queue.empty())
+        self.assertEqual(queue.byte_count, 0)
+
+    def test_disconnect_policy_refuses_messages_over_the_byte_limit(self):
+        queue = make_queue(DISCONNECT, max_bytes=4)
+        self.assertTrue(queue.put(b'aaa'))
+        self.assertFalse(queue.put(b'bb', droppable=True))
+
+    def test_drop_oldest_policy_drops_only_droppable_messages(self):
+        queue = make_queue(DROP_OLDEST, max_messages=3)
+        queue.put(b'keep1')
+        queue.put(b'drop1', droppable=True)
+        queue.put(b'drop2', droppable=True)
+        self.assertTrue(queue.put(b'keep2'))
+        self.assertEqual(queue.get_all(), [b'keep1', b'drop2', b'keep2'])
+        self.assertEqual(overflow_actions.values[('test_drop_oldest', DROP_OLDEST)], 1)
+
+        queue.put(b'keep1')
+        queue.put(b'keep2')
+        queue.put(b'keep3')
+        self.assertFalse(queue.put(b'keep4'))
+
+    def test_consumed_droppable_messages_are_not_dropped_again(self):
+        queue = make_queue(DROP_OLDEST, max_messages=1)
+        queue.put(b'drop1', droppable=True)
+        self.assertEqual(queue.get_nowait(), b'drop1')
+        queue.put(b'keep1')
+        self.assertFalse(queue.put(b'keep2'))
+
+    def test_consumed_messages_are_not_kept(self):
+        for policy in (DISCONNECT, DROP_OLDEST):
+            with self.subTest(policy=policy):
+                queue = make_queue(policy, max_messages=10)
+                for i in range(1000):
+                    queue.put(b'drop%d' % i, droppable=True)
+                    queue.get_nowait()
+                self.assertTrue(queue.empty())
+                self.assertEqual(len(queue.droppable_entries), 0)
+
+    def test_coalesce_policy_replaces_messages_with_the_same_key(self):
+        queue = make_queue(COALESCE)
+        queue.put(b'servers1', replace_key='servers')
+        queue.put(b'other')
+        queue.put(b'servers2', replace_key='servers')
+        self.assertEqual(queue.qsize(), 2)
+        self.assertEqual(queue.get_all(), [b'other', b'servers2'])
+
+    def test_removed_messages_are_compacted(self):
+        queue = make_queue(COALESCE)
+        for i in range(1000):
+            queue.put(b'servers%d' % i, replace_key='servers')
+        self.assertEqual(queue.qsize(), 1)
+        self.assertLess(len(queue.entries), 20)
+        self.assertEqual(queue.get_nowait(), b'servers999')
+
+    def test_unlimited_messages_bypass_the_limits(self):
+        queue = make_queue(DISCONNECT, max_messages=1)
+        queue.put(b'a')
+        queue.put_unlimited('disconnect')
+        self.assertEqual(queue.get_all(), [b'a', 'disconnect'])
@@ -0,0 +1,84 @@
+import time
+import unittest
+
+import gevent
+import gevent.queue
+
+from common.pendingcallbacks import PendingCallbacks, ExecuteCallbackMessage
+
+
+class Receiver:
+    pass
+
+
+class TestPendingCallbacks(unittest.TestCase):
+
+    def setUp(self):
+        self.server_queue = gevent.queue.Queue()
+        self.pending_callbacks = PendingCallbacks(self.server_queue)
+        self.executed = []
+
+    def tearDown(self):
+        if self.pending_callbacks.scheduler is not None:
+            self.pending_callbacks.scheduler.kill()
+
+    def execute_next_message(self):
+        msg = self.server_queue.get(timeout=1)
+        self.assertIsInstance(msg, ExecuteCallbackMessage)
+        self.pending_callbacks.execute(msg.callbacks)
+
+    def test_due_callbacks_are_posted_together_in_order(self):
+        receiver = Receiver()
+        self.pending_callbacks.add(receiver, 0.02, lambda: self.executed.append('second'))
+        self.pending_callbacks.add(receiver, 0.01, lambda: self.executed.append('first'))
+        # Block without yielding so that both are due when the scheduler first runs
+        time.sleep(0.03)
+
+        self.execute_next_message()
+        self.assertEqual(self.executed, ['first', 'second'])
+        self.assertTrue(self.server_queue.empty())
+        self.assertEqual(self.pending_callbacks.callbacks_by_receiver, {})
+
+    def test_earlier_callback_wakes_up_the_scheduler(self):
+        self.pending_callbacks.add(Receiver(), 10, lambda: self.executed.append('late'))
+        gevent.sleep(0)
+        self.pending_callbacks.add(Receiver(), 0.01, lambda: self.executed.append('early'))
+
+        self.execute_next_message()
+        self.assertEqual(self.executed, ['early'])
+
+    def test_removed_receiver_callbacks_are_not_executed(self):
+        removed = Receiver()
+        kept = Receiver()
+        self.pending_callbacks.add(removed, 0.01, lambda: self.executed.append('removed'))
+        self.pending_callbacks.add(kept, 0.01, lambda: self.executed.append('kept'))
+        self.pending_callbacks.remove_receiver(removed)
+
+        self.execute_next_message()
+        self.assertEqual(self.executed, ['kept'])
+
+    def test_callbacks_removed_after_posting_are_not_executed(self):
+        receiver = Receiver()
+        self.pending_callbacks.add(receiver, 0.01, lambda: self.executed.append('removed'))
+        msg = self.server_queue.get(timeout=1)
+        self.pending_callbacks.remove_receiver(receiver)
+
+        self.pending_callbacks.execute(msg.callbacks)
+        self.assertEqual(self.executed, [])
+
+    def test_callback_can_reschedule_itself(self):
+        receiver = Receiver()
+
+        def callback():
+            self.executed.append(len(self.executed))
+            if len(self.executed) < 3:
+                self.pending_callbacks.add(receiver, 0.01, callback)
+
+        self.pending_callbacks.add(receiver, 0.01, callback)
+        for _ in range(3):
+            self.execute_next_message()
+        self.assertEqual(self.executed, [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import socket
+import struct
+import unittest
+
+from common.tcpmessage import BufferedTcpMessageReader, TcpMessageWriter
+
+
+class TestBufferedTcpMessageReader(unittest.TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = socket.socketpair()
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def test_receive_splits_messages(self):
+        params = [([b'a'], 'single message'),
+                  ([b'abc', b'de', b'f' * 100], 'several messages in one read'),
+                  ([b'x' * 1450, b'y'], 'message of the maximum size')]
+
+        for messages, comment in params:
+            with self.subTest(comment=comment):
+                reader = BufferedTcpMessageReader(self.receiver, max_message_size = 1450)
+                writer = TcpMessageWriter(self.sender, max_message_size = 1450)
+                for message in messages:
+                    writer.send(message)
+                received = [reader.receive() for _ in messages]
+                self.assertEqual(received, messages)
+
+    def test_receive_all_returns_every_complete_message(self):
+        reader = BufferedTcpMessageReader(self.receiver, max_message_size = 1450)
+        self.sender.sendall(struct.pack('<H', 1) + b'a' + struct.pack('<H', 2) + b'bc' + struct.pack('<H', 3) + b'd')
+        self.assertEqual(reader.receive_all(), [b'a', b'bc'])
+        self.sender.sendall(b'ef')
+        self.assertEqual(reader.receive_all(), [b'def'])
+
+    def test_message_spanning_the_end_of_the_buffer(self):
+        reader = BufferedTcpMessageReader(self.receiver, max_message_size = 100, buffer_size = 0)
+        messages = [bytes([i]) * (i % 100 + 1) for i in range(200)]
+        self.sender.sendall(b''.join(struct.pack('<H', len(m)) + m for m in messages))
+        self.assertEqual([reader.receive() for _ in messages], messages)
+
+    def test_closed_connection(self):
+        reader = BufferedTcpMessageReader(self.receiver)
+        self.sender.sendall(struct.pack('<H', 3) + b'a')
+        self.sender.close()
+        with self.assertRaises(ConnectionResetError):
+            reader.receive()
+
+
+class PartialSendSocket:
+    """ Socket stand-in that accepts at most a few bytes per call """
+    def __init__(self, max_bytes_per_call):
+        self.max_bytes_per_call = max_bytes_per_call
+        self.sent = bytearray()
+
+    def sendmsg(self, buffers):
+        data = b''.join(buffers)[:self.max_bytes_per_call]
+        self.sent += data
+        return len(data)
+
+
+class TestTcpMessageWriter(unittest.TestCase):
+
+    def test_send_many_framing(self):
+        params = [(1, 'short message'),
+                  (1449, 'just below the maximum size'),
+                  (1450, 'exactly the maximum size'),
+                  (1451, 'just above the maximum size'),
+                  (5000, 'several frames')]
+
+        for size, comment in params:
+            with self.subTest(size=size, comment=comment):
+                data = bytes(i % 251 for i in range(size))
+                expected = bytearray()
+                remaining = data
+                while remaining:
+                    expected += struct.pack('<H', len(remaining) if len(remaining) < 1450 else 0)
+                    expected += remaining[:1450]
+                    remaining = remaining[1450:]
+
+                sock = PartialSendSocket(max_bytes_per_call = 1000)
+                writer = TcpMessageWriter(sock, max_message_size = 1450)
+                writer.send_many([data, b'end'])
+                self.assertEqual(bytes(sock.sent), bytes(expected) + struct.pack('<H', 3) + b'end')
+
+    def test_send_empty_message(self):
+        writer = TcpMessageWriter(PartialSendSocket(100))
+        with self.assertRaises(ValueError):
+            writer.send(b'')
+
+
+class TestTcpMessageWriterNowait(unittest.TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = socket.socketpair()
+        self.sender.setblocking(False)
+        self.writer = TcpMessageWriter(self.sender, max_message_size = 1450)
+        self.reader = BufferedTcpMessageReader(self.receiver, max_message_size = 1450)
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def test_sends_directly_when_there_is_room(self):
+        self.assertTrue(self.writer.send_many_nowait([b'abc', b'def']))
+        self.assertEqual(self.writer.backlog_size(), 0)
+        self.assertEqual(self.reader.receive_all(), [b'abc', b'def'])
+
+    def test_keeps_backlog_when_send_buffer_is_full(self):
+        messages = [bytes([i % 256]) * 1000 for i in range(5000)]
+        all_sent = True
+        for message in messages:
+            all_sent = self.writer.send_many_nowait([message]) and all_sent
+        self.assertFalse(all_sent)
+        self.assertGreater(self.writer.backlog_size(), 0)
+
+        received = []
+        while self.writer.backlog:
+            # Make room in the send buffer before flushing what is left
+            received += self.reader.receive_all()
+            try:
+                self.writer.flush()
+            except BlockingIOError:
+                pass
+        while len(received) < len(messages):
+            received += self.reader.receive_all()
+        self.assertEqual(received, messages)
+
+if __name__ == '__main__':
+    unittest.main()
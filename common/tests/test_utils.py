@@ -0,0 +1,48 @@
+import unittest
+
+from common.utils import IdAllocator, first_unused_number_above
+
+
+class TestIdAllocator(unittest.TestCase):
+
+    def test_allocates_consecutive_numbers_from_minimum(self):
+        allocator = IdAllocator(10)
+        self.assertEqual([allocator.allocate() for _ in range(3)], [10, 11, 12])
+
+    def test_reuses_lowest_released_number_first(self):
+        allocator = IdAllocator(0)
+        for _ in range(5):
+            allocator.allocate()
+        allocator.release(3)
+        allocator.release(1)
+        self.assertEqual([allocator.allocate() for _ in range(3)], [1, 3, 5])
+
+    def test_matches_first_unused_number_above(self):
+        allocator = IdAllocator(0)
+        used = set()
+        for i in range(200):
+            if i % 3 == 2:
+                number = sorted(used)[(i * 7) % len(used)]
+                used.remove(number)
+                allocator.release(number)
+            expected = first_unused_number_above(used, 0)
+            self.assertEqual(allocator.allocate(), expected)
+            used.add(expected)
+
+    def test_raises_when_range_is_exhausted(self):
+        allocator = IdAllocator(1, 2)
+        allocator.allocate()
+        allocator.allocate()
+        with self.assertRaises(RuntimeError):
+            allocator.allocate()
+
+    def test_contains_checks_range(self):
+        allocator = IdAllocator(5, 10)
+        self.assertIn(5, allocator)
+        self.assertIn(10, allocator)
+        self.assertNotIn(4, allocator)
+        self.assertNotIn(11, allocator)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,7 @@
 # along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import heapq
 import os
 
 MIN_UNVERIFIED_ID = 1000000
@@ -40,5 +41,36 @@ def first_unused_number_above(numbers, minimum, maximum=None):
     return first_number_above
 
 
+class IdAllocator:
+    """
+    Hands out unique numbers from a range, always the lowest one that is
+    currently unused, without having to look at the numbers in use.
+    """
+    def __init__(self, minimum, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.next_unused = minimum
+        self.released = []
+
+    def allocate(self):
+        if self.released:
+            return heapq.heappop(self.released)
+
+        if self.maximum is not None and self.next_unused > self.maximum:
+            raise RuntimeError(f'Unable to allocate an unused number between {self.minimum} and {self.maximum}. '
+                               f'All are in use.')
+        number = self.next_unused
+        self.next_unused += 1
+        return number
+
+    def release(self, number):
+        assert self.minimum <= number < self.next_unused
+        heapq.heappush(self.released, number)
+
+    def __contains__(self, number):
+        """ Returns whether number is in the range of numbers handed out by this allocator """
+        return self.minimum <= number and (self.maximum is None or number <= self.maximum)
+
+
 def is_valid_ascii_for_name(ascii_bytes):
     return all((33 <= c <= 126 and chr(c) not in r'#/:?\`~') for c in ascii_bytes)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Coordination of the worker processes of a login server that runs as several
+processes accepting players on the same port.
+
+Each worker handles the connections and state of its own players. What
+needs to be consistent between all players is left to the coordinator,
+which runs in the process that started the workers and which the workers
+connect to over a local TCP connection with JSON messages. For now that
+is the choice of display names, which must be unique among all players.
+"""
+
+import json
+import logging
+
+import gevent
+import gevent.queue
+
+from common.connectionhandler import *
+from common.geventwrapper import gevent_spawn
+from common.statetracer import statetracer
+from .playerdirectory import PlayerDirectory
+from .player.state.unauthenticated_state import choose_display_name
+
+
+class CoordinatorMessage:
+    """ A message between a worker and the coordinator, which is a dict with at least a 'type' """
+    def __init__(self, content):
+        self.content = content
+
+
+class JsonMessageReader(TcpMessageConnectionReader):
+    def decode(self, msg_bytes):
+        return CoordinatorMessage(json.loads(msg_bytes))
+
+
+class JsonMessageWriter(TcpMessageConnectionWriter):
+    def encode(self, msg):
+        return json.dumps(msg).encode('utf8')
+
+
+class Worker(Peer):
+    """ A worker as seen by the coordinator """
+    pass
+
+
+class CoordinatorPeer(Peer):
+    """ The coordinator as seen by a worker """
+    pass
+
+
+class WorkerHandler(IncomingConnectionHandler):
+    def __init__(self, incoming_queue, port):
+        super().__init__('worker', '127.0.0.1', port, incoming_queue)
+
+    def create_connection_instances(self, sock, address):
+        return JsonMessageReader(sock), JsonMessageWriter(sock), Worker()
+
+
+class CoordinatorClientHandler(OutgoingConnectionHandler):
+    def __init__(self, incoming_queue, port):
+        super().__init__('coordinator', '127.0.0.1', port, incoming_queue)
+
+    def create_connection_instances(self, sock, address):
+        return JsonMessageReader(sock), JsonMessageWriter(sock), CoordinatorPeer()
+
+
+def handle_workers(incoming_queue, port):
+    WorkerHandler(incoming_queue, port).run()
+
+
+def handle_coordinator(incoming_queue, port, retry_time=1):
+    """
+    Connects to the coordinator and returns when the connection is lost, which
+    ends the worker, because the coordinator is gone or will not know about
+    the worker's players anymore
+    """
+    coordinator_client_handler = CoordinatorClientHandler(incoming_queue, port)
+    coordinator_client_handler.run(retry_time)
+
+
+@statetracer('unique_id', 'login_name', 'display_name', 'game_server')
+class RegisteredPlayer:
+    """ What the coordinator knows about a player of one of the workers """
+    def __init__(self, worker, unique_id, login_name, display_name):
+        self.worker = worker
+        self.unique_id = unique_id
+        self.login_name = login_name
+        self.display_name = display_name
+        self.game_server = None
+
+
+class Coordinator:
+    def __init__(self, incoming_queue):
+        self.logger = logging.getLogger(__name__)
+        self.incoming_queue = incoming_queue
+        self.workers = set()
+        self.players = PlayerDirectory()
+        self.message_handlers = {
+            'register_player': self.handle_register_player,
+            'unregister_player': self.handle_unregister_player,
+            'change_unique_id': self.handle_change_unique_id,
+        }
+
+    def run(self):
+        gevent.getcurrent().name = 'coordinator'
+        self.logger.info('coordinator started')
+        while True:
+            message = self.incoming_queue.get()
+            if isinstance(message, PeerConnectedMessage):
+                self.workers.add(message.peer)
+                self.logger.info('worker %s(%s) connected' % (message.peer.task_name, message.peer.task_id))
+            elif isinstance(message, PeerDisconnectedMessage):
+                self.handle_worker_disconnected(message.peer)
+            else:
+                content = message.content
+                self.message_handlers[content['type']](message.peer, content)
+
+    def handle_worker_disconnected(self, worker):
+        self.logger.info('worker %s(%s) disconnected' % (worker.task_name, worker.task_id))
+        self.workers.discard(worker)
+        for player in [player for player in self.players.values() if player.worker is worker]:
+            del self.players[player.unique_id]
+        worker.disconnect()
+
+    def handle_register_player(self, worker, content):
+        """
+        Registers a player that is logging in on a worker and tells the worker
+        which display name to use. A worker that reconnects registers its
+        players again with the display names they already have.
+        """
+        unique_id = content['unique_id']
+        self.players.pop(unique_id, None)
+        display_name = content.get('display_name')
+        if display_name is None:
+            display_name = choose_display_name(content['login_name'], content['verified'],
+                                               self.players, content['max_name_length'])
+        self.players[unique_id] = RegisteredPlayer(worker, unique_id, content['login_name'], display_name)
+        worker.send({'type': 'display_name_chosen',
+                     'request_id': content.get('request_id'),
+                     'unique_id': unique_id,
+                     'display_name': display_name})
+
+    def handle_unregister_player(self, worker, content):
+        player = self.players.get(content['unique_id'])
+        if player is not None and player.worker is worker:
+            del self.players[player.unique_id]
+
+    def handle_change_unique_id(self, worker, content):
+        player = self.players.pop(content['old_id'], None)
+        if player is not None:
+            player.unique_id = content['new_id']
+            self.players[player.unique_id] = player
+
+
+def handle_coordinator_server(port):
+    incoming_queue = gevent.queue.Queue()
+    tasks = [
+        gevent_spawn("coordinator's run", Coordinator(incoming_queue).run),
+        gevent_spawn("coordinator's handle_workers", handle_workers, incoming_queue, port),
+    ]
+    gevent.joinall(tasks, raise_error=True, count=1)
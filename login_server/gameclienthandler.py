@@ -24,21 +24,28 @@ from .player.player import Player
 
 
 class GameClientHandler(IncomingConnectionHandler):
-    def __init__(self, incoming_queue, dump_queue, data_root):
+    def __init__(self, incoming_queue, dump_queue, data_root, direct_send=False, outgoing_limits=None,
+                 transport=None, codec_pool=None):
         super().__init__('gameclient',
                          '0.0.0.0',
                          9000,
-                         incoming_queue)
+                         incoming_queue,
+                         direct_send,
+                         outgoing_limits,
+                         transport)
         self.dump_queue = dump_queue
         self.data_root = data_root
+        self.codec_pool = codec_pool
 
     def create_connection_instances(self, sock, address):
-        reader = LoginProtocolReader(sock, self.dump_queue)
+        reader = LoginProtocolReader(sock, self.dump_queue, self.codec_pool)
         writer = LoginProtocolWriter(sock, self.dump_queue)
         peer = Player(address, self.data_root)
         return reader, writer, peer
 
 
-def handle_game_client(incoming_queue, dump_queue, data_root):
-    game_client_handler = GameClientHandler(incoming_queue, dump_queue, data_root)
+def handle_game_client(incoming_queue, dump_queue, data_root, direct_send=False, outgoing_limits=None,
+                       transport=None, codec_pool=None):
+    game_client_handler = GameClientHandler(incoming_queue, dump_queue, data_root, direct_send, outgoing_limits,
+                                            transport, codec_pool)
     game_client_handler.run()
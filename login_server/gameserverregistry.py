@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from common.datatypes import m00e9, encode_enumfields
+from common.statetracer import IndexedTracingDict
+
+
+# Members of a game server that m00e9.traced_server_fields depends on
+_server_list_members = {
+    'server_id',
+    'players',
+    'region',
+    'password_hash',
+    'game_setting_mode',
+    'description',
+    'motd',
+    'map_id',
+    'be_score',
+    'ds_score',
+}
+
+
+class GameServerRegistry(IndexedTracingDict):
+    """
+    Dictionary of game servers with indexes on server_id and match_id.
+
+    Like the players in a PlayerDirectory, the game servers must be
+    state-traced with at least server_id and match_id among their traced
+    members, so that the indexes follow changes to them.
+
+    It also keeps the encoded server list entry of each game server, without
+    the time remaining and the address field that depends on the player
+    asking for the list. Those two are encoded for each request and spliced
+    in. A cached entry is dropped by the listener on the server's state
+    tracer when a member it depends on is set. Because players is changed in
+    place, the entry also remembers the player count it was encoded with.
+    """
+
+    indexed_attributes = {
+        'server_id': None,
+        'match_id': None,
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.server_list_entries = {}
+        super().__init__(*args, **kwargs)
+
+    def _remove_from_indexes(self, game_server):
+        super()._remove_from_indexes(game_server)
+        self.server_list_entries.pop(game_server, None)
+
+    def _value_changed(self, game_server, member_name, old_value, new_value):
+        super()._value_changed(game_server, member_name, old_value, new_value)
+        if member_name in _server_list_members:
+            self.server_list_entries.pop(game_server, None)
+
+    def find_one_by(self, **kwargs):
+        """ Returns the game server whose attributes have the given values, or None """
+        matching_servers = self.find_by(**kwargs)
+        assert len(matching_servers) <= 1
+        return matching_servers[0] if matching_servers else None
+
+    def server_list_entry(self, game_server, player_address):
+        """ Returns the encoded inner array of m00e9 for game_server as seen from player_address """
+        cached_entry = self.server_list_entries.get(game_server)
+        if cached_entry is None or cached_entry[0] != len(game_server.players):
+            cached_entry = (len(game_server.players), *m00e9.encode_traced_server_fields(game_server))
+            self.server_list_entries[game_server] = cached_entry
+        _, encoded_before_time_remaining, encoded_after_time_remaining = cached_entry
+        return b''.join((encoded_before_time_remaining,
+                         encode_enumfields([m00e9.time_remaining_field(game_server)]),
+                         encoded_after_time_remaining,
+                         encode_enumfields([m00e9.server_address_field(game_server, player_address)])))
+
+    def server_list(self, player_address):
+        """ Returns an m00e9 listing all joinable game servers as seen from player_address """
+        return m00e9().set([self.server_list_entry(game_server, player_address)
+                            for game_server in self.values() if game_server.joinable])
@@ -19,42 +19,91 @@
 #
 
 import gevent
+import gevent.queue
 import datetime
 import hashlib
+import itertools
 import logging
+import time
 
 from common.connectionhandler import PeerConnectedMessage, PeerDisconnectedMessage
 from common.datatypes import *
 from common.ipaddresspair import IPAddressPair
 from common.loginprotocol import LoginProtocolMessage
+from common.messagestats import MessageStats
+from common import latencytracing
+from common import metrics
 #from common.messages import *
-from common.statetracer import statetracer, TracingDict
+from common.statetracer import statetracer
 #from .gameserver import GameServer
 from common.pendingcallbacks import PendingCallbacks, ExecuteCallbackMessage
-from .player.player import Player
+from .coordinator import CoordinatorMessage, CoordinatorPeer
+from .player.player import Player, players_per_state
+from .gameserverregistry import GameServerRegistry
+from .playerdirectory import PlayerDirectory
 from .player.state.offline_state import OfflineState
-from .player.state.unauthenticated_state import UnauthenticatedState
+from .player.state.unauthenticated_state import UnauthenticatedState, choose_display_name
 from .protocol_errors import ProtocolViolationError
+from .serverstats import ServerStatsPublisher, ServerStatsRequestMessage
 from common import utils
 
 
+connections = metrics.Counter('gaserver_player_connections_total', 'Number of player connections accepted.')
+requests = metrics.Counter('gaserver_requests_total', 'Number of requests received from players per ident.', ['ident'])
+players_online = metrics.Gauge('gaserver_players_online', 'Number of connected players.')
+server_queue_depth = metrics.Gauge('gaserver_server_queue_depth', 'Number of messages waiting in the server queue.')
+outgoing_queue_depth = metrics.Gauge('gaserver_outgoing_queue_depth',
+                                     'Total and largest number of messages waiting to be sent to players.',
+                                     ['aggregate'])
+
+
 @statetracer('address_pair', 'game_servers', 'players')
 class LoginServer:
-    def __init__(self, server_queue, client_queues, server_stats_queue, ports):
+    # Maximum number of messages taken from the server queue before handling them
+    max_batch_size = 256
+
+    def __init__(self, server_queue, client_queues, server_stats_queue, ports, server_stats_interval=1.0,
+                 metrics_interval=5.0, unverified_id_range=(utils.MIN_UNVERIFIED_ID, utils.MAX_UNVERIFIED_ID),
+                 coordinated=False):
         self.logger = logging.getLogger(__name__)
         self.server_queue = server_queue
         self.client_queues = client_queues
         self.server_stats_queue = server_stats_queue
-
-        self.game_servers = TracingDict()
-
-        self.players = TracingDict()
+        self.server_stats = ServerStatsPublisher(server_stats_queue)
+        self.server_stats_interval = server_stats_interval
+        self.metrics_interval = metrics_interval
+
+        self.game_servers = GameServerRegistry()
+
+        self.players = PlayerDirectory()
+        # Workers of a multi-process login server each get their own range of
+        # unverified IDs and leave the choice of display names to the coordinator
+        self.unverified_ids = utils.IdAllocator(*unverified_id_range)
+        self.coordinated = coordinated
+        self.coordinator = None
+        self.display_name_requests = itertools.count(1)
         self.message_handlers = {
             ExecuteCallbackMessage: self.handle_execute_callback_message,
             PeerConnectedMessage: self.handle_client_connected_message,
             PeerDisconnectedMessage: self.handle_client_disconnected_message,
             LoginProtocolMessage: self.handle_client_message,
+            ServerStatsRequestMessage: self.handle_server_stats_request_message,
+            CoordinatorMessage: self.handle_coordinator_message,
+        }
+        # Messages within a batch are handled in order of priority (lowest first)
+        # and in the order they were received for equal priorities. Connect
+        # messages share the priority of client requests because those may
+        # depend on the connect having been handled.
+        self.message_priorities = {
+            PeerConnectedMessage: 0,
+            LoginProtocolMessage: 0,
+            CoordinatorMessage: 0,
+            PeerDisconnectedMessage: 1,
+            ExecuteCallbackMessage: 2,
+            ServerStatsRequestMessage: 2,
         }
+        self.coalesced_tasks = {}
+        self.message_stats = MessageStats()
         self.pending_callbacks = PendingCallbacks(server_queue)
         self.last_player_update_time = datetime.datetime.utcnow()
 
@@ -70,32 +119,85 @@ class LoginServer:
     def run(self):
         gevent.getcurrent().name = 'loginserver'
         self.logger.info('login server started')
+        self.update_metrics()
         while True:
-            for message in self.server_queue:
-                handler = self.message_handlers[type(message)]
-                try:
-                    handler(message)
-                except Exception as e:
-                    if hasattr(message, 'peer'):
-                        self.logger.error('an exception occurred while handling a message; passing it on to the peer...')
-                        message.peer.disconnect(e)
-                    else:
-                        raise
+            self.handle_batch(self.receive_batch())
+
+    def receive_batch(self):
+        batch = [self.server_queue.get()]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.server_queue.get_nowait())
+            except gevent.queue.Empty:
+                break
+        return batch
+
+    def handle_batch(self, batch):
+        message_priorities = self.message_priorities
+        batch.sort(key=lambda message: message_priorities[type(message)])
+        for message in batch:
+            self.handle_message(message)
+        self.run_coalesced_tasks()
+        self.message_stats.record_batch(len(batch))
+
+    def handle_message(self, message):
+        handler = self.message_handlers[type(message)]
+        start_time = time.perf_counter()
+        try:
+            handler(message)
+        except Exception as e:
+            if hasattr(message, 'peer'):
+                self.logger.error('an exception occurred while handling a message; passing it on to the peer...')
+                message.peer.disconnect(e)
+            else:
+                raise
+        finally:
+            self.message_stats.record(type(message).__name__, start_time)
+
+    def coalesce(self, task):
+        """
+        Runs task once after the current batch of messages has been handled,
+        no matter how many times it is requested during the batch
+        """
+        self.coalesced_tasks[task] = None
+
+    def update_metrics(self):
+        """
+        Takes a snapshot of all metrics to be served to whoever asks for them
+        until the next one is taken metrics_interval seconds later
+        """
+        players_online.set(len(self.players))
+        server_queue_depth.set(self.server_queue.qsize())
+        # Only done once per interval, so that serving the metrics does not require going over all players
+        queue_sizes = [player.outgoing_queue_size() for player in self.players.values()]
+        outgoing_queue_depth.set(sum(queue_sizes), labels=('sum',))
+        outgoing_queue_depth.set(max(queue_sizes, default=0), labels=('max',))
+        metrics.default_registry.take_snapshot()
+        self.pending_callbacks.add(self, self.metrics_interval, self.update_metrics)
+
+    def run_coalesced_tasks(self):
+        while self.coalesced_tasks:
+            tasks = self.coalesced_tasks
+            self.coalesced_tasks = {}
+            for task in tasks:
+                start_time = time.perf_counter()
+                task()
+                self.message_stats.record(task.__name__, start_time)
 
     def all_game_servers(self):
         return self.game_servers
 
     def find_server_by_id(self, server_id):
-        for game_server in self.all_game_servers().values():
-            if game_server.server_id == server_id:
-                return game_server
-        raise ProtocolViolationError('No server found with specified server ID')
+        game_server = self.game_servers.find_one_by(server_id=server_id)
+        if game_server is None:
+            raise ProtocolViolationError('No server found with specified server ID')
+        return game_server
 
     def find_server_by_match_id(self, match_id):
-        for game_server in self.all_game_servers().values():
-            if game_server.match_id == match_id:
-                return game_server
-        raise ProtocolViolationError('No server found with specified match ID')
+        game_server = self.game_servers.find_one_by(match_id=match_id)
+        if game_server is None:
+            raise ProtocolViolationError('No server found with specified match ID')
+        return game_server
 
     def find_player_by(self, **kwargs):
         matching_players = self.find_players_by(**kwargs)
@@ -106,19 +208,10 @@ class LoginServer:
         return matching_players[0] if matching_players else None
 
     def find_players_by(self, **kwargs):
-        matching_players = self.players.values()
-        for key, val in kwargs.items():
-            matching_players = [player for player in matching_players if getattr(player, key) == val]
-
-        return matching_players
+        return self.players.find_by(**kwargs)
 
     def find_player_by_display_name(self, display_name):
-        matching_players = [p for p in self.players.values()
-                            if p.display_name is not None and p.display_name.lower() == display_name.lower()]
-        if matching_players:
-            return matching_players[0]
-        else:
-            return None
+        return self.players.find_by_display_name(display_name)
 
     def change_player_unique_id(self, old_id, new_id):
         if new_id in self.players:
@@ -130,6 +223,41 @@ class LoginServer:
         player = self.players.pop(old_id)
         player.unique_id = new_id
         self.players[new_id] = player
+        self._release_unique_id(old_id)
+        if self.coordinator:
+            self.coordinator.send({'type': 'change_unique_id', 'old_id': old_id, 'new_id': new_id})
+
+    def _release_unique_id(self, unique_id):
+        if unique_id in self.unverified_ids:
+            self.unverified_ids.release(unique_id)
+
+    def request_display_name(self, player):
+        """
+        Chooses a display name for a player that is logging in and passes it to
+        the player's state. In a worker of a multi-process login server this
+        is done by the coordinator, so the name may be passed on later.
+        """
+        if not self.coordinated:
+            player.state.on_display_name_chosen(choose_display_name(player.login_name,
+                                                                    player.verified,
+                                                                    self.players,
+                                                                    player.max_name_length))
+        else:
+            # Unique IDs of players that disconnected are reused, so the reply
+            # is matched to this request rather than to the ID
+            player.display_name_request = next(self.display_name_requests)
+            if self.coordinator:
+                self._register_with_coordinator(player)
+            # Otherwise the player is registered once the coordinator connects
+
+    def _register_with_coordinator(self, player):
+        self.coordinator.send({'type': 'register_player',
+                               'request_id': player.display_name_request,
+                               'unique_id': player.unique_id,
+                               'login_name': player.login_name,
+                               'verified': player.verified,
+                               'max_name_length': player.max_name_length,
+                               'display_name': player.display_name})
 
     def validate_username(self, username):
         if len(username) < Player.min_name_length:
@@ -151,28 +279,37 @@ class LoginServer:
 
         return None
 
-    def send_server_stats(self):
-        stats = [
-            {'locked':      gs.password_hash is not None,
-             'mode':        gs.game_setting_mode,
-             'description': gs.description,
-             'nplayers':    len(gs.players)} for gs in self.game_servers.values() if gs.joinable
-        ]
-        self.server_stats_queue.put(stats)
+    def server_stats_changed(self, game_server, removed=False):
+        """
+        Marks the stats of a game server as changed. Changes are published as a
+        single delta after server_stats_interval seconds, or after the current
+        batch of messages if the interval is 0.
+        """
+        if self.server_stats.mark_dirty(game_server, removed):
+            if self.server_stats_interval > 0:
+                self.pending_callbacks.add(self, self.server_stats_interval, self.publish_server_stats)
+            else:
+                self.coalesce(self.publish_server_stats)
+
+    def publish_server_stats(self):
+        self.server_stats.publish_changes()
 
     def email_address_to_hash(self, email_address):
         email_hash = hashlib.sha256(email_address.encode('utf-8')).hexdigest()
         return email_hash
 
+    def handle_server_stats_request_message(self, msg):
+        self.server_stats.publish_snapshot()
+
     def handle_execute_callback_message(self, msg):
-        callback_id = msg.callback_id
-        self.pending_callbacks.execute(callback_id)
+        self.pending_callbacks.execute(msg.callbacks)
 
     def handle_client_connected_message(self, msg):
-        if isinstance(msg.peer, Player):
-            unique_id = utils.first_unused_number_above(self.players.keys(),
-                                                        utils.MIN_UNVERIFIED_ID,
-                                                        utils.MAX_UNVERIFIED_ID)
+        if isinstance(msg.peer, CoordinatorPeer):
+            self.handle_coordinator_connected(msg.peer)
+        elif isinstance(msg.peer, Player):
+            connections.inc()
+            unique_id = self.unverified_ids.allocate()
 
             player = msg.peer
             player.unique_id = unique_id
@@ -184,21 +321,62 @@ class LoginServer:
             assert False, "Invalid connection message received"
 
     def handle_client_disconnected_message(self, msg):
-        if isinstance(msg.peer, Player):
+        if isinstance(msg.peer, CoordinatorPeer):
+            self.logger.error('lost the connection to the coordinator')
+            msg.peer.disconnect()
+            self.coordinator = None
+        elif isinstance(msg.peer, Player):
             player = msg.peer
             player.disconnect()
+            if self.coordinator:
+                self.coordinator.send({'type': 'unregister_player', 'unique_id': player.unique_id})
             self.pending_callbacks.remove_receiver(player)
             player.set_state(OfflineState)
+            # Players are forgotten once they are offline
+            players_per_state.dec(labels=(OfflineState.__name__,))
             del(self.players[player.unique_id])
+            self._release_unique_id(player.unique_id)
         else:
             assert False, "Invalid disconnection message received"
 
+    def handle_coordinator_connected(self, coordinator):
+        self.logger.info('connected to the coordinator')
+        self.coordinator = coordinator
+        # Players that logged in before the coordinator was reachable are
+        # registered now, along with the display names of those that have one
+        for player in self.players.values():
+            if player.display_name is not None or player.display_name_request is not None:
+                self._register_with_coordinator(player)
+
+    def handle_coordinator_message(self, msg):
+        content = msg.content
+        if content['type'] == 'display_name_chosen':
+            player = self.players.get(content['unique_id'])
+            if player is not None and \
+               player.display_name_request is not None and \
+               player.display_name_request == content['request_id'] and \
+               isinstance(player.state, UnauthenticatedState):
+                player.display_name_request = None
+                player.state.on_display_name_chosen(content['display_name'])
+        else:
+            self.logger.error('received an unknown message from the coordinator: %s' % content['type'])
+
     def handle_client_message(self, msg):
         current_player = msg.peer
+        trace = msg.trace
 
-        for request in msg.requests:
-            if not current_player.handle_request(request):
-                self.logger.info('%s sent: %04X' % (current_player, request.ident))
+        if trace:
+            trace.end_stage('queue_wait')
+            latencytracing.active_trace = trace
+        try:
+            for request in msg.requests:
+                requests.inc(labels=('a%04x' % request.ident,))
+                if not current_player.handle_request(request):
+                    self.logger.info('%s sent: %04X' % (current_player, request.ident))
+                if trace:
+                    trace.end_stage('handler', (request.ident,))
+        finally:
+            latencytracing.active_trace = None
 
         # This output is mostly for debugging of the incorrect number of players/servers online
         current_time = datetime.datetime.utcnow()
@@ -27,15 +27,29 @@ import gevent
 import gevent.queue
 import logging
 import os
+import subprocess
 import sys
 
+from common import latencytracing
+from common.asynciotransport import AsyncioTransport
+from common.codecpool import CodecPool
+from common.connectionhandler import GeventTransport
 from common.geventwrapper import gevent_spawn
 from common.logging import set_up_logging
+from common.outgoingqueue import DISCONNECT, OutgoingLimits
 from common.ports import Ports
+from common import utils
 from common.utils import get_shared_ini_path
+from .coordinator import handle_coordinator, handle_coordinator_server
 from .gameclienthandler import handle_game_client
 from .trafficdumper import TrafficDumper, dumpfilename
 from .loginserver import LoginServer
+from .metricsserver import handle_metrics_server
+
+transports = {
+    'gevent': GeventTransport,
+    'asyncio': AsyncioTransport,
+}
 
 
 def handle_dump(dumpqueue):
@@ -45,12 +59,44 @@ def handle_dump(dumpqueue):
         traffic_dumper.run()
 
 
-def handle_server(server_queue, client_queues, server_stats_queue, ports):
-    server = LoginServer(server_queue, client_queues, server_stats_queue, ports)
+def handle_server(server_queue, client_queues, server_stats_queue, ports, server_stats_interval, metrics_interval,
+                  unverified_id_range, coordinated):
+    server = LoginServer(server_queue, client_queues, server_stats_queue, ports, server_stats_interval,
+                         metrics_interval, unverified_id_range, coordinated)
     # server.trace_as('loginserver')
     server.run()
 
 
+def worker_unverified_id_range(worker_index, nworkers):
+    """ Returns the part of the range of unverified IDs that a worker hands out """
+    range_size = (utils.MAX_UNVERIFIED_ID - utils.MIN_UNVERIFIED_ID + 1) // nworkers
+    first_id = utils.MIN_UNVERIFIED_ID + worker_index * range_size
+    return first_id, first_id + range_size - 1
+
+
+def run_workers(nworkers, data_root, dump):
+    """ Runs the worker processes of a multi-process login server until one of them exits """
+    logger = logging.getLogger(__name__)
+    processes = []
+    try:
+        for worker_index in range(nworkers):
+            command = [sys.executable, '-c', 'from login_server import main; main.main()',
+                       '--data-root', data_root, '--worker', str(worker_index)]
+            # Only one worker dumps traffic, because they would all write to the same file
+            if dump and worker_index == 0:
+                command.append('--dump')
+            processes.append(subprocess.Popen(command))
+
+        while all(process.poll() is None for process in processes):
+            gevent.sleep(1)
+
+        logger.error('worker processes exited with codes %s' % [process.returncode for process in processes])
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+
 def main():
     logger = logging.getLogger(__name__)
     parser = argparse.ArgumentParser()
@@ -60,15 +106,17 @@ def main():
                              dumpfilename)
     parser.add_argument('--data-root', action='store', default='data',
                         help='Location of the data dir containing all config files and logs.')
+    parser.add_argument('--worker', action='store', type=int, default=None,
+                        help='Run as the worker with this index of a login server that is '
+                             'configured to use multiple worker processes.')
     args = parser.parse_args()
     data_root = args.data_root
     
-    set_up_logging(data_root, 'login_server.log')
+    set_up_logging(data_root, 'login_server.log' if args.worker is None else 'login_server_worker%d.log' % args.worker)
 
     client_queues = {}
     server_queue = gevent.queue.Queue()
     server_stats_queue = gevent.queue.Queue()
-    dump_queue = gevent.queue.Queue() if args.dump else None
 
     config = configparser.ConfigParser()
     with open(os.path.join(data_root, 'loginserver.ini')) as f:
@@ -77,18 +125,67 @@ def main():
         config.read_file(f)
 
     ports = Ports(int(config['shared']['port_offset']))
-
-    tasks = [
-        gevent_spawn("login server's handle_server",
-                     handle_server,
-                     server_queue,
-                     client_queues,
-                     server_stats_queue,
-                     ports),
-        gevent_spawn("login server's handle_game_client",
-                     handle_game_client,
-                     server_queue, dump_queue, data_root),
-    ]
+    server_stats_interval = config.getfloat('loginserver', 'server_stats_interval', fallback=1.0)
+    metrics_interval = config.getfloat('loginserver', 'metrics_interval', fallback=5.0)
+    latencytracing.set_sample_rate(config.getfloat('loginserver', 'latency_sample_rate', fallback=0.01))
+    direct_send = config.getboolean('loginserver', 'direct_send', fallback=False)
+    outgoing_limits = OutgoingLimits(config.getint('loginserver', 'outgoing_max_messages', fallback=1000),
+                                     config.getint('loginserver', 'outgoing_max_bytes', fallback=1024 * 1024),
+                                     config.get('loginserver', 'outgoing_overflow_policy', fallback=DISCONNECT))
+    # With more than one worker, this process only starts the workers and
+    # coordinates them, while the workers all accept players on the same port
+    nworkers = config.getint('loginserver', 'workers', fallback=1)
+    is_worker = args.worker is not None
+    is_supervisor = nworkers > 1 and not is_worker
+    # A supervisor leaves dumping traffic to its first worker
+    dump_queue = gevent.queue.Queue() if args.dump and not is_supervisor else None
+    transport = transports[config.get('loginserver', 'transport', fallback='gevent')](reuse_port=is_worker)
+    if is_worker:
+        unverified_id_range = worker_unverified_id_range(args.worker, nworkers)
+    else:
+        unverified_id_range = (utils.MIN_UNVERIFIED_ID, utils.MAX_UNVERIFIED_ID)
+
+    if is_supervisor:
+        tasks = [
+            gevent_spawn("login server's handle_coordinator_server",
+                         handle_coordinator_server,
+                         ports['logincoordinator']),
+            gevent_spawn("login server's run_workers",
+                         run_workers,
+                         nworkers, data_root, args.dump),
+        ]
+    else:
+        # Large requests can be decoded by a pool of other processes
+        codec_processes = config.getint('loginserver', 'codec_processes', fallback=0)
+        codec_pool = None
+        if codec_processes > 0:
+            codec_pool = CodecPool(codec_processes,
+                                   config.getint('loginserver', 'codec_offload_min_bytes', fallback=1024))
+        tasks = [
+            gevent_spawn("login server's handle_server",
+                         handle_server,
+                         server_queue,
+                         client_queues,
+                         server_stats_queue,
+                         ports,
+                         server_stats_interval,
+                         metrics_interval,
+                         unverified_id_range,
+                         is_worker),
+            gevent_spawn("login server's handle_game_client",
+                         handle_game_client,
+                         server_queue, dump_queue, data_root, direct_send, outgoing_limits, transport,
+                         codec_pool),
+        ]
+        # Metrics are per process, so with several workers only the first one serves them
+        if not is_worker or args.worker == 0:
+            tasks.append(gevent_spawn("login server's handle_metrics_server",
+                                      handle_metrics_server,
+                                      ports['restapi']))
+        if is_worker:
+            tasks.append(gevent_spawn("login server's handle_coordinator",
+                                      handle_coordinator,
+                                      server_queue, ports['logincoordinator']))
     # Give the greenlets enough time to start up, otherwise killall can block
     gevent.sleep(1)
 
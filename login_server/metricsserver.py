@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import gevent
+import gevent.pywsgi
+import logging
+
+from common import metrics
+
+
+def metrics_app(environ, start_response):
+    if environ['PATH_INFO'] != '/metrics':
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not found\n']
+
+    # The snapshot is taken by the login server, so nothing is computed here
+    snapshot = metrics.default_registry.snapshot
+    start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                              ('Content-Length', str(len(snapshot)))])
+    return [snapshot]
+
+
+def handle_metrics_server(port):
+    gevent.getcurrent().name = 'metricsserver'
+    logger = logging.getLogger(__name__)
+    server = gevent.pywsgi.WSGIServer(('0.0.0.0', port), metrics_app, log=None)
+    logger.info('serving metrics on port %d' % port)
+    server.serve_forever()
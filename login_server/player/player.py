@@ -26,9 +26,13 @@ from ipaddress import IPv4Address
 
 from common.connectionhandler import Peer
 from common.ipaddresspair import IPAddressPair
+from common.metrics import Gauge
 from common.statetracer import statetracer, RefOnly
 
 
+players_per_state = Gauge('gaserver_players', 'Number of connected players per state.', ['state'])
+
+
 @statetracer('unique_id', 'login_name', 'display_name', 'address_pair', 'port', 'verified',
              RefOnly('game_server'), 'vote', 'team')
 class Player(Peer):
@@ -44,6 +48,8 @@ class Player(Peer):
         self.unique_id: int = None
         self.login_name: str = None
         self.display_name: str = None
+        # Set while the coordinator of a multi-process login server is choosing the display name
+        self.display_name_request: int = None
         self.password_hash: str = None
         self.port = address[1]
         self.verified = False
@@ -89,15 +95,17 @@ class Player(Peer):
 
         if self.state:
             self.state.on_exit()
+            players_per_state.dec(labels=(type(self.state).__name__,))
 
         self.state = state_class(self, *args, **kwargs)
+        players_per_state.inc(labels=(state_class.__name__,))
         self.state.on_enter()
 
     def handle_request(self, request):
         return self.state.handle_request(request)
 
-    def send(self, data):
-        super().send(data)
+    def send(self, data, droppable=False, replace_key=None):
+        super().send(data, droppable, replace_key)
 
     def __repr__(self):
         return '%s(%s, %s:%s, %d:"%s")' % (self.task_name, self.task_id,
@@ -22,10 +22,56 @@
 import datetime
 
 from common.datatypes import *
+from common.messagetemplate import MessageTemplate, TemplateSlot
 from .player_state import PlayerState, handles, handles_control_message
 from common import utils
 
 
+a0034_template = MessageTemplate(a0034().set([
+    TemplateSlot('display_name', m03c5()),
+    m010c().set([
+        [
+            m00b5().set(0x2ac950),
+            m03df().set(0x237),
+            m0287().set(0x645),
+            m0282().set(0x85d),
+            m0276().set(0x355),
+            m0326().set("Dome City"),
+            m0563().set(0x1f4),
+            m0480().set(0xb),
+        ],
+    ]),
+    m0180(),
+    m0136()
+]))
+
+a0039_template = MessageTemplate(a0039().set([
+    m0241(),
+    m02a9().set(0x00000497),
+    m00b5().set(0x002ac950),
+    TemplateSlot('display_name', m03c5()),
+    m0327(),
+    m03df().set(0x00000237),
+    m00c2().set("22976"),
+    m0303(),
+    m0485(),
+    m001f(),
+    m0029(),
+    m0388(),
+    m00bf().set(hexparse('02 00 23 29 7f 00 00 01')),
+]))
+
+a01e8_template = MessageTemplate(a01e8().set([
+    #m04da().set(0x2), #or m05d1().set(0x1) how to handle ambiguous..?
+    m04da().set(0x2),
+    m05d1().set(0x1),
+]))
+
+a0188_template = MessageTemplate(a0188().set([
+    m0376(),
+]))
+
+
 class AuthenticatedState(PlayerState):
 
     def on_enter(self):
@@ -36,55 +82,19 @@ class AuthenticatedState(PlayerState):
 
     @handles(packet=a0034)
     def handle_a0034(self, request):
-        self.player.send(a0034().set([
-            m03c5().set(self.player.display_name),
-            m010c().set([
-                [
-                    m00b5().set(0x2ac950),
-                    m03df().set(0x237),
-                    m0287().set(0x645),
-                    m0282().set(0x85d),
-                    m0276().set(0x355),
-                    m0326().set("Dome City"),
-                    m0563().set(0x1f4),
-                    m0480().set(0xb),
-                ],
-            ]),
-            m0180(),
-            m0136()
-        ]))
+        self.player.send(a0034_template.render(display_name=self.player.display_name))
 
     @handles(packet=a0039)
     def handle_a0039(self, request):
-        self.player.send(a0039().set([
-            m0241(),
-            m02a9().set(0x00000497),
-            m00b5().set(0x002ac950),
-            m03c5().set(self.player.display_name),
-            m0327(),
-            m03df().set(0x00000237),
-            m00c2().set("22976"),
-            m0303(),
-            m0485(),
-            m001f(),
-            m0029(),
-            m0388(),
-            m00bf().set(hexparse('02 00 23 29 7f 00 00 01')),
-        ]))
+        self.player.send(a0039_template.render(display_name=self.player.display_name))
 
     @handles(packet=a01e8)
     def handle_a01e8(self, request):
-        self.player.send(a01e8().set([
-            #m04da().set(0x2), #or m05d1().set(0x1) how to handle ambiguous..?
-            m04da().set(0x2),
-            m05d1().set(0x1),
-        ]))
+        self.player.send(a01e8_template.render())
 
     @handles(packet=a0188)
     def handle_a0188(self, request):
-        self.player.send(a0188().set([
-            m0376(),
-        ]))
+        self.player.send(a0188_template.render())
 
 '''
 0000009E`  0  : enumfield 01E8 enumblockarray length 1 (field 0x01E8: DEFEND_ALLIANCE_ID?)
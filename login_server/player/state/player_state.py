@@ -63,24 +63,40 @@ def handles_control_message(messageType):
     return real_decorator
 
 
+def _collect_handlers(cls, attribute_name):
+    handlers = {}
+    for name, func in inspect.getmembers(cls, inspect.isfunction):
+        handled = getattr(func, attribute_name, None)
+        if handled is not None:
+            if handled in handlers:
+                raise ValueError('Duplicate handlers found in %s for %s: %s and %s' %
+                                 (cls.__name__, handled.__name__, handlers[handled].__name__, name))
+            handlers[handled] = func
+    return handlers
+
+
 class PlayerState:
+    packet_handlers = {}
+    control_message_handlers = {}
+
+    def __init_subclass__(cls, **kwargs):
+        # Build the dispatch tables once per state class, including the
+        # handlers it inherits from its base classes
+        super().__init_subclass__(**kwargs)
+        cls.packet_handlers = _collect_handlers(cls, 'handles_packet')
+        cls.control_message_handlers = _collect_handlers(cls, 'handles_message')
+
     def __init__(self, player: Player):
         self.logger = logging.getLogger(__name__)
         self.player = player
 
     def handle_request(self, request):
-        methods = [
-            func for name, func in inspect.getmembers(self) if
-            getattr(func, 'handles_packet', None) == type(request)
-        ]
-        if not methods:
+        handler = self.packet_handlers.get(type(request))
+        if handler is None:
             self.logger.warning("No handler found for request %s" % request)
             return False
 
-        if len(methods) > 1:
-            raise ValueError("Duplicate handlers found for request")
-
-        return methods[0](request)
+        return handler(self, request)
 
     #@handles(packet=a01c8)
     #def handle_ping(self, request):
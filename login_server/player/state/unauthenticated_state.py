@@ -20,26 +20,70 @@
 #
 
 from common.datatypes import *
+from common.messagetemplate import MessageTemplate, TemplateSlot
 from .authenticated_state import AuthenticatedState
 from ..state.player_state import PlayerState, handles
+from ...playerdirectory import unverified_display_name
 
 
-def choose_display_name(login_name, verified, names_in_use, max_name_length):
+def choose_display_name(login_name, verified, players, max_name_length):
     if verified:
         display_name = login_name[:max_name_length]
     else:
         prefix = 'unvrf-'
-        display_name = prefix + login_name[:max_name_length - len(prefix)]
-        index = 2
-        lowercase_names_in_use = [name.lower() for name in names_in_use]
-        while display_name.lower() in lowercase_names_in_use:
-            display_name = 'unv%02d-%s' % (index, login_name[:max_name_length - len(prefix)])
-            index += 1
-            assert index < 100
+        name = login_name[:max_name_length - len(prefix)]
+        number = players.first_free_unverified_name_number(name)
+        assert number is not None
+        display_name = unverified_display_name(name, number)
 
     return display_name
 
 
+a003b_template = MessageTemplate(a003b().set([
+    m0536().set(0x01050001),
+    m0473()
+]))
+
+login_reply_template = MessageTemplate([
+    a003e().set([
+        m03c3().set(0x0017e6d5),
+        m0375().set(0xf3f8),
+        m01ff(),
+        m0213().set(hexparse('01 00 6e')),
+        TemplateSlot('display_name', m03c5()),
+        m04d4().set(1),
+        m036e().set(0x4949),
+        m0064(),
+        m0473(),
+        m00db().set(0x8bcc),
+        m0270().set(0xf),
+        m001c().set(0x384),
+        m04ff().set("pageup"),
+        m010c().set([
+            [
+                m04da().set(1),
+                m0371().set(0xa26f),
+            ],
+            [
+                m04da().set(2),
+                m0371().set(0xa20b),
+            ],
+            [
+                m04da().set(4),
+                m0371().set(0xcfac),
+            ]
+        ])
+
+    ]),
+    m0170().set([
+        [
+            m0322().set(0x46b),
+            m0262().set(0xab95),
+        ],
+    ]),
+])
+
+
 class UnauthenticatedState(PlayerState):
     def on_enter(self):
         self.logger.info("%s is entering state %s" % (self.player, type(self).__name__))
@@ -48,10 +92,7 @@ class UnauthenticatedState(PlayerState):
     @handles(packet=a003b)
     def handle_login_request(self, request):
         if request.findbytype(m0071) is None:  # request for login
-            self.player.send(a003b().set([
-                m0536().set(0x01050001),
-                m0473()
-            ]))
+            self.player.send(a003b_template.render())
 
         else:  # actual login
             self.player.login_name = request.findbytype(m052d).value
@@ -75,48 +116,9 @@ class UnauthenticatedState(PlayerState):
                                  (self.player.login_name.encode('latin1'), validation_failure))
 
             else:
-                names_in_use = [p.display_name for p in self.player.login_server.players.values()
-                                if p.display_name is not None]
-                self.player.display_name = choose_display_name(self.player.login_name,
-                                                               self.player.verified,
-                                                               names_in_use,
-                                                               self.player.max_name_length)
-                self.player.send([
-                    a003e().set([
-                        m03c3().set(0x0017e6d5),
-                        m0375().set(0xf3f8),
-                        m01ff(),
-                        m0213().set(hexparse('01 00 6e')),
-                        m03c5().set(self.player.display_name),
-                        m04d4().set(1),
-                        m036e().set(0x4949),
-                        m0064(),
-                        m0473(),
-                        m00db().set(0x8bcc),
-                        m0270().set(0xf),
-                        m001c().set(0x384),
-                        m04ff().set("pageup"),
-                        m010c().set([
-                            [
-                                m04da().set(1),
-                                m0371().set(0xa26f),
-                            ],
-                            [
-                                m04da().set(2),
-                                m0371().set(0xa20b),
-                            ],
-                            [
-                                m04da().set(4),
-                                m0371().set(0xcfac),
-                            ]
-                        ])
+                self.player.login_server.request_display_name(self.player)
 
-                    ]),
-                    m0170().set([
-                        [
-                            m0322().set(0x46b),
-                            m0262().set(0xab95),
-                        ],
-                    ]),
-                ])
-                self.player.set_state(AuthenticatedState)
\ No newline at end of file
+    def on_display_name_chosen(self, display_name):
+        self.player.display_name = display_name
+        self.player.send(login_reply_template.render(display_name=self.player.display_name))
+        self.player.set_state(AuthenticatedState)
\ No newline at end of file
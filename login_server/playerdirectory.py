@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+import re
+from collections import Counter
+
+from common.statetracer import IndexedTracingDict
+
+MAX_UNVERIFIED_NAME_NUMBER = 99
+
+_unverified_name_pattern = re.compile(r'unv(rf|\d\d)-(.*)', re.DOTALL)
+
+
+def _casefold(display_name):
+    return display_name.lower() if display_name is not None else None
+
+
+def unverified_display_name(name, number):
+    """ Returns the display name for an unverified player, where number 1 is unvrf- and others are unvNN- """
+    return 'unvrf-' + name if number == 1 else 'unv%02d-%s' % (number, name)
+
+
+def _parse_unverified_display_name(display_name):
+    """ Splits a case-folded unverified display name into its name and number, or returns None """
+    match = _unverified_name_pattern.fullmatch(display_name)
+    if not match:
+        return None
+    number = 1 if match.group(1) == 'rf' else int(match.group(1))
+    if number < 2 and match.group(1) != 'rf':
+        return None
+    return match.group(2), number
+
+
+class PlayerDirectory(IndexedTracingDict):
+    """
+    Dictionary of players by unique ID with secondary indexes on some of their
+    attributes.
+
+    Display names of the form unvrf-<name> and unvNN-<name> are additionally
+    indexed by <name>, so that the first free number for a new unverified
+    player can be found without trying every one of them.
+    """
+
+    indexed_attributes = {
+        'unique_id': None,
+        'login_name': None,
+        'display_name': _casefold,
+        'game_server': None,
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.unverified_name_numbers = {}
+        super().__init__(*args, **kwargs)
+
+    def _add_to_index(self, player, attribute_name, value):
+        super()._add_to_index(player, attribute_name, value)
+        if attribute_name == 'display_name' and value is not None:
+            parsed_name = _parse_unverified_display_name(_casefold(value))
+            if parsed_name:
+                name, number = parsed_name
+                self.unverified_name_numbers.setdefault(name, Counter())[number] += 1
+
+    def _remove_from_index(self, player, attribute_name, value):
+        super()._remove_from_index(player, attribute_name, value)
+        if attribute_name == 'display_name' and value is not None:
+            parsed_name = _parse_unverified_display_name(_casefold(value))
+            if parsed_name:
+                name, number = parsed_name
+                numbers = self.unverified_name_numbers[name]
+                numbers[number] -= 1
+                if numbers[number] == 0:
+                    del numbers[number]
+                    if not numbers:
+                        del self.unverified_name_numbers[name]
+
+    def find_by_display_name(self, display_name):
+        """ Returns a player whose display name matches regardless of case, or None """
+        matches = self.indexes['display_name'].get(_casefold(display_name))
+        return next(iter(matches)) if matches else None
+
+    def first_free_unverified_name_number(self, name):
+        """
+        Returns the lowest number for which unverified_display_name(name, number)
+        is not in use regardless of case, or None if all of them are taken
+        """
+        numbers_in_use = self.unverified_name_numbers.get(_casefold(name), ())
+        return next((number for number in range(1, MAX_UNVERIFIED_NAME_NUMBER + 1)
+                     if number not in numbers_in_use), None)
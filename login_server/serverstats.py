@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026  Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This file is part of gaserver
+# 
+# gaserver is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# gaserver is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with gaserver.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+class ServerStatsSnapshot:
+    """ Stats of all joinable game servers, by server ID """
+    def __init__(self, servers):
+        self.servers = servers
+
+
+class ServerStatsDelta:
+    """ Stats of the game servers that changed and IDs of those that are no longer listed since the last publish """
+    def __init__(self, changed, removed):
+        self.changed = changed
+        self.removed = removed
+
+
+class ServerStatsRequestMessage:
+    """ Can be put on the server queue by a consumer of server stats to get a full ServerStatsSnapshot """
+    pass
+
+
+def game_server_stats(game_server):
+    return {'locked':      game_server.password_hash is not None,
+            'mode':        game_server.game_setting_mode,
+            'description': game_server.description,
+            'nplayers':    len(game_server.players)}
+
+
+class ServerStatsPublisher:
+    """
+    Keeps the last published stats of every joinable game server and the set
+    of servers whose stats may have changed since then, so that publishing
+    only needs to look at the servers that were marked dirty.
+    """
+    def __init__(self, stats_queue):
+        self.stats_queue = stats_queue
+        self.published = {}
+        self.dirty = {}
+
+    def mark_dirty(self, game_server, removed=False):
+        """ Returns True if this is the first change since the last publish """
+        first_change = not self.dirty
+        # A removal must not be undone by a later change to the same server object
+        if self.dirty.get(game_server.server_id, (None, False))[1]:
+            removed = True
+        self.dirty[game_server.server_id] = (game_server, removed)
+        return first_change
+
+    def publish_changes(self):
+        changed = {}
+        removed = []
+        for server_id, (game_server, server_removed) in self.dirty.items():
+            if server_removed or not game_server.joinable:
+                if self.published.pop(server_id, None) is not None:
+                    removed.append(server_id)
+            else:
+                stats = game_server_stats(game_server)
+                if self.published.get(server_id) != stats:
+                    self.published[server_id] = stats
+                    changed[server_id] = stats
+        self.dirty = {}
+
+        if changed or removed:
+            self.stats_queue.put(ServerStatsDelta(changed, removed))
+
+    def publish_snapshot(self):
+        self.publish_changes()
+        self.stats_queue.put(ServerStatsSnapshot(dict(self.published)))